@@ -1,14 +1,63 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import cv2
 import numpy as np
-import io
-import base64
+import os
+import sys
+import json
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from typing import List
 from pydantic import BaseModel
 
-app = FastAPI()
+# Allow `uvicorn main:app` from inside api/ as well as `uvicorn api.main:app`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.analysis_cache import AnalysisCache, DEFAULT_CACHE_PATH
+from core.metrics import compute_metrics
+from utils import instrumentation
+from utils.instrumentation import instrumented
+
+# Bump when process_image's output changes
+API_ANALYSIS_VERSION = "api-1"
+
+# Keep at most this many finished jobs around for polling
+MAX_JOBS = 100
+
+# Analysis runs off the event loop on a thread pool (OpenCV releases the GIL)
+# or a process pool; AILBUMS_API_QUEUE bounds images queued or in progress
+EXECUTOR_KIND = os.environ.get("AILBUMS_API_EXECUTOR", "thread")
+WORKERS = int(os.environ.get("AILBUMS_API_WORKERS", "0")) or os.cpu_count() or 1
+QUEUE_LIMIT = int(os.environ.get("AILBUMS_API_QUEUE", "0")) or WORKERS * 4
+# Batches and jobs wait for queue slots instead of failing, but only this many at once
+MAX_ACTIVE_BATCHES = int(os.environ.get("AILBUMS_API_BATCHES", "4"))
+
+# Stage timings for /metrics are on unless AILBUMS_METRICS=0
+instrumentation.enable(os.environ.get(instrumentation.METRICS_ENV, "1") != "0")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Made on the serving event loop rather than at import
+    global analysis_slots
+    analysis_slots = asyncio.Semaphore(QUEUE_LIMIT)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+if EXECUTOR_KIND == "process":
+    executor = ProcessPoolExecutor(max_workers=WORKERS, initializer=instrumentation.worker_init)
+else:
+    executor = ThreadPoolExecutor(max_workers=WORKERS)
+# Hashing uploads and SQLite lookups also stay off the event loop, on their
+# own threads so cache hits don't queue behind analyses
+cache_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="cache")
+analysis_slots = None
+active_batches = 0
+jobs = OrderedDict()
+cache = AnalysisCache(os.environ.get("AILBUMS_CACHE", DEFAULT_CACHE_PATH), version=API_ANALYSIS_VERSION)
 
 # Configure CORS
 app.add_middleware(
@@ -26,25 +75,37 @@ class ImageAnalysis(BaseModel):
     exposure_quality: str
     total_score: float
 
+_local = threading.local()
+
+def get_face_cascade():
+    # CascadeClassifier isn't thread safe, so each executor worker keeps its own
+    cascade = getattr(_local, "face_cascade", None)
+    if cascade is None:
+        cascade = _local.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+    return cascade
+
+@instrumented("api_analysis")
 def process_image(image_bytes: bytes) -> ImageAnalysis:
     # Convert bytes to numpy array
     nparr = np.frombuffer(image_bytes, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
-    # Calculate blur score
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
+    # Blur, brightness and histogram from one grayscale pass
+    metrics = compute_metrics(img)
+    gray = metrics["gray"]
+    blur_score = metrics["blur"]
     
     # Basic face analysis (simplified for example)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+    faces = get_face_cascade().detectMultiScale(gray, 1.3, 5)
     
     # Default values
     eyes_open = len(faces) > 0  # Simplified
     smiling = len(faces) > 0    # Simplified
     
     # Calculate exposure
-    mean_brightness = np.mean(gray)
+    mean_brightness = metrics["mean"]
     if mean_brightness < 60:
         exposure_quality = "underexposed"
     elif mean_brightness > 190:
@@ -69,8 +130,182 @@ def process_image(image_bytes: bytes) -> ImageAnalysis:
         total_score=total_score
     )
 
+def process_image_in_worker(image_bytes: bytes):
+    # Process executor entry point: the worker's stage timings ride back with the result
+    return process_image(image_bytes), instrumentation.collect()
+
+async def run_analysis(image_bytes: bytes) -> ImageAnalysis:
+    loop = asyncio.get_running_loop()
+    if EXECUTOR_KIND != "process":
+        return await loop.run_in_executor(executor, process_image, image_bytes)
+    analysis, metrics = await loop.run_in_executor(executor, process_image_in_worker, image_bytes)
+    instrumentation.merge(metrics)
+    return analysis
+
+def server_busy():
+    return HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+
+def cache_lookup(image_bytes: bytes):
+    key = cache.key_for_bytes(image_bytes)
+    return key, cache.get(key, ["api"])
+
+async def analyze_bytes(image_bytes: bytes, wait: bool = False) -> ImageAnalysis:
+    loop = asyncio.get_running_loop()
+    key, cached = await loop.run_in_executor(cache_executor, cache_lookup, image_bytes)
+    if "api" in cached:
+        instrumentation.increment("api_cache_hits")
+        return ImageAnalysis(**cached["api"])
+    # Single requests are refused when the queue is full; batches wait their turn
+    if not wait and analysis_slots.locked():
+        instrumentation.increment("api_rejected_busy")
+        raise server_busy()
+    async with analysis_slots:
+        analysis = await run_analysis(image_bytes)
+    await loop.run_in_executor(cache_executor, cache.put, key, {"api": dict(analysis)})
+    return analysis
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(instrumentation.registry.prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/cull")
 async def cull_image(file: UploadFile = File(...)):
     contents = await file.read()
-    analysis = process_image(contents)
-    return analysis
\ No newline at end of file
+    analysis = await analyze_bytes(contents)
+    return analysis
+
+async def analyze_uploads(uploads):
+    # Yields one result dict per upload, in completion order; closing it early
+    # (the client went away) cancels analyses still waiting for a slot
+    async def analyze(index, filename, contents):
+        try:
+            analysis = await analyze_bytes(contents, wait=True)
+            return {"index": index, "filename": filename, "analysis": dict(analysis)}
+        except Exception as e:
+            return {"index": index, "filename": filename, "error": str(e)}
+
+    tasks = [asyncio.ensure_future(analyze(i, filename, contents)) for i, (filename, contents) in enumerate(uploads)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def admit_batch():
+    # Takes a slot before the response starts, so concurrent requests can't all get in
+    global active_batches
+    if active_batches >= MAX_ACTIVE_BATCHES:
+        raise HTTPException(status_code=429, detail="Too many batches in progress", headers={"Retry-After": "5"})
+    active_batches += 1
+
+def release_batch():
+    global active_batches
+    active_batches -= 1
+
+async def read_uploads(files):
+    # Called with a batch slot held; gives it back if the uploads can't be read
+    try:
+        return [(f.filename, await f.read()) for f in files]
+    except BaseException:
+        release_batch()
+        raise
+
+class BatchResponse(StreamingResponse):
+    # Gives back the batch slot however the response ends, including a client
+    # that disconnects before streaming starts
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            release_batch()
+
+def ndjson(results, response_class=StreamingResponse):
+    async def lines():
+        try:
+            async for result in results:
+                yield json.dumps(result) + "\n"
+        finally:
+            await results.aclose()
+    return response_class(lines(), media_type="application/x-ndjson")
+
+@app.post("/cull/batch")
+async def cull_batch(files: List[UploadFile] = File(...)):
+    admit_batch()
+    uploads = await read_uploads(files)
+    return ndjson(analyze_uploads(uploads), BatchResponse)
+
+
+class Job:
+    def __init__(self, total):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.results = []
+        self.done = False
+        self.updated = asyncio.Condition()
+
+    def status(self, include_results=True):
+        status = {"job_id": self.id, "total": self.total, "completed": len(self.results), "done": self.done}
+        if include_results:
+            status["results"] = self.results
+        return status
+
+    async def run(self, uploads):
+        # Holds the batch slot submit_job() took until the job finishes
+        results = analyze_uploads(uploads)
+        try:
+            async for result in results:
+                async with self.updated:
+                    self.results.append(result)
+                    self.updated.notify_all()
+        finally:
+            await results.aclose()
+            release_batch()
+            async with self.updated:
+                self.done = True
+                self.updated.notify_all()
+
+    async def follow(self):
+        # Yields every result, waiting for new ones until the job finishes
+        sent = 0
+        while True:
+            async with self.updated:
+                while sent == len(self.results) and not self.done:
+                    await self.updated.wait()
+                pending = self.results[sent:]
+                finished = self.done
+            for result in pending:
+                yield result
+            sent += len(pending)
+            if finished and sent == len(self.results):
+                yield self.status(include_results=False)
+                return
+
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.post("/jobs")
+async def submit_job(files: List[UploadFile] = File(...)):
+    admit_batch()
+    uploads = await read_uploads(files)
+    job = Job(len(uploads))
+    jobs[job.id] = job
+    while len(jobs) > MAX_JOBS:
+        oldest = next((j for j in jobs.values() if j.done), None)
+        if oldest is None:
+            break
+        del jobs[oldest.id]
+    job.task = asyncio.create_task(job.run(uploads))
+    return job.status(include_results=False)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return get_job(job_id).status()
+
+@app.get("/jobs/{job_id}/stream")
+async def job_stream(job_id: str):
+    return ndjson(get_job(job_id).follow())
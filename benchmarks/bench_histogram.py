@@ -0,0 +1,79 @@
+"""Microbenchmark for exposure/histogram analysis.
+
+    python -m benchmarks.bench_histogram [--side 512] [--images 200]
+
+Compares the old separate blur + exposure passes (two grayscale conversions,
+np.mean, np.std, calcHist and scipy's find_peaks when scipy is installed)
+with the fused core.metrics kernel.
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from core.metrics import compute_metrics, compute_metrics_batch, count_peaks, histogram_shape
+
+
+def make_images(count, side, seed=0):
+    rng = np.random.default_rng(seed)
+    height = side * 2 // 3
+    images = []
+    for i in range(count):
+        base = rng.integers(0, 256, (height // 8, side // 8, 3), dtype=np.uint8)
+        img = cv2.resize(base, (side, height), interpolation=cv2.INTER_CUBIC)
+        images.append(cv2.convertScaleAbs(img, alpha=0.5 + (i % 5) * 0.25))
+    return images
+
+
+def separate_passes(image, find_peaks):
+    # Old get_blur_score followed by old analyze_exposure
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blur = cv2.Laplacian(gray, cv2.CV_64F).var()
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+    hist = hist.ravel() / hist.sum()
+    mean = np.mean(gray)
+    std = np.std(gray)
+    peaks = len(find_peaks(hist)[0]) if find_peaks else 0
+    return blur, mean, std, peaks
+
+
+def timed(label, func, repeat, count):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<34} {best * 1000:9.2f} ms  {best / count * 1e6:9.1f} us/image")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--side", type=int, default=512)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        from scipy.signal import find_peaks
+    except ImportError:
+        find_peaks = None
+
+    images = make_images(args.images, args.side)
+    hists = np.stack([compute_metrics(img)["hist"] for img in images])
+    stack = np.stack(images)
+    n = len(images)
+
+    print(f"{n} images at {images[0].shape[1]}x{images[0].shape[0]}, best of {args.repeat}")
+    timed("separate passes" + ("" if find_peaks else " (no scipy)"),
+          lambda: [separate_passes(img, find_peaks) for img in images], args.repeat, n)
+    timed("compute_metrics", lambda: [compute_metrics(img) for img in images], args.repeat, n)
+    timed("compute_metrics_batch", lambda: compute_metrics_batch(stack), args.repeat, n)
+    timed("count_peaks (batched hists)", lambda: count_peaks(hists), args.repeat, n)
+    timed("histogram_shape (batched hists)", lambda: histogram_shape(hists), args.repeat, n)
+    if find_peaks:
+        timed("scipy find_peaks per hist", lambda: [find_peaks(h) for h in hists], args.repeat, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Deterministic synthetic photo corpus for benchmarks.
+
+    python -m benchmarks.corpus <folder> [--scenes 12] [--burst 4] [--sides 1024,2048,4000]
+
+Every scene is a textured background with a few drawn faces (skin ellipse,
+eyes, mouth), written as a burst of slightly shifted frames with EXIF capture
+times 50 ms apart, plus blurred, under- and over-exposed variants. The same
+arguments always produce the same files, and no network access is needed.
+Drawn faces exercise the face stages' code paths but are not guaranteed to be
+detected as faces.
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+from PIL import Image
+
+EXIF_IFD = 0x8769
+MAKE = 0x010F
+MODEL = 0x0110
+DATETIME_ORIGINAL = 0x9003
+SUBSEC_TIME_ORIGINAL = 0x9291
+BODY_SERIAL_NUMBER = 0xA431
+
+# name -> (blur sigma as a fraction of the long side, exposure gain, offset)
+VARIANTS = {
+    "sharp": (0.0, 1.0, 0),
+    "blurred": (0.004, 1.0, 0),
+    "dark": (0.0, 0.35, -10),
+    "bright": (0.0, 1.6, 60),
+}
+CORPUS_MANIFEST = "corpus.json"
+SHOOT_START = datetime(2024, 6, 1, 10, 0, 0)
+
+
+def _scene(rng, side):
+    height = side * 2 // 3
+    base = rng.integers(40, 220, (height // 16 + 1, side // 16 + 1, 3), dtype=np.uint8)
+    image = cv2.resize(base, (side, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.normal(0, 6, image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    for _ in range(int(rng.integers(1, 4))):
+        cx, cy = int(rng.integers(side // 5, side * 4 // 5)), int(rng.integers(height // 4, height * 3 // 4))
+        r = int(side * rng.uniform(0.05, 0.1))
+        cv2.ellipse(image, (cx, cy), (r, int(r * 1.3)), 0, 0, 360, (150, 180, 225), -1)
+        for dx in (-r // 2, r // 2):
+            cv2.ellipse(image, (cx + dx, cy - r // 4), (r // 6, r // 10), 0, 0, 360, (255, 255, 255), -1)
+            cv2.circle(image, (cx + dx, cy - r // 4), max(1, r // 14), (40, 30, 20), -1)
+        cv2.ellipse(image, (cx, cy + r // 2), (r // 3, r // 6), 0, 0, 180, (60, 40, 160), max(1, r // 20))
+    return image
+
+
+def _variant(image, name):
+    sigma, gain, offset = VARIANTS[name]
+    if sigma:
+        image = cv2.GaussianBlur(image, (0, 0), sigma * max(image.shape[:2]))
+    if gain != 1.0 or offset:
+        image = cv2.convertScaleAbs(image, alpha=gain, beta=offset)
+    return image
+
+
+def _save(path, image, scene, frame):
+    pil = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    exif = pil.getexif()
+    exif[MAKE] = "Bench"
+    exif[MODEL] = "Synthetic"
+    ifd = exif.get_ifd(EXIF_IFD)
+    ifd[BODY_SERIAL_NUMBER] = "0001"
+    # Scenes a minute apart, burst frames 50 ms apart (20 fps)
+    taken = SHOOT_START + timedelta(minutes=scene, milliseconds=frame * 50)
+    ifd[DATETIME_ORIGINAL] = taken.strftime("%Y:%m:%d %H:%M:%S")
+    ifd[SUBSEC_TIME_ORIGINAL] = f"{taken.microsecond // 1000:03d}"
+    pil.save(path, quality=90, exif=exif)
+
+
+def generate(folder, scenes=12, burst=4, sides=(1024, 2048, 4000), seed=0):
+    """Writes the corpus (skipped if an identical one is already there) and
+    returns the sorted list of image paths."""
+    params = {"scenes": scenes, "burst": burst, "sides": list(sides), "seed": seed, "variants": list(VARIANTS)}
+    manifest = os.path.join(folder, CORPUS_MANIFEST)
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            existing = json.load(f)
+        if existing["params"] == params and all(os.path.exists(os.path.join(folder, n)) for n in existing["files"]):
+            return [os.path.join(folder, n) for n in existing["files"]]
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    files = []
+    for scene in range(scenes):
+        side = sides[scene % len(sides)]
+        base = _scene(rng, side)
+        for frame in range(burst):
+            # Handheld burst: a few pixels of drift per frame
+            shift = np.float32([[1, 0, frame * side / 500], [0, 1, frame * side / 800]])
+            image = cv2.warpAffine(base, shift, (base.shape[1], base.shape[0]), borderMode=cv2.BORDER_REFLECT)
+            variant = list(VARIANTS)[frame % len(VARIANTS)] if frame else "sharp"
+            name = f"scene{scene:03d}_f{frame:02d}_{variant}_{side}.jpg"
+            _save(os.path.join(folder, name), _variant(image, variant), scene, frame)
+            files.append(name)
+
+    with open(manifest, "w") as f:
+        json.dump({"params": params, "files": files}, f, indent=2)
+    return [os.path.join(folder, name) for name in files]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folder")
+    parser.add_argument("--scenes", type=int, default=12)
+    parser.add_argument("--burst", type=int, default=4)
+    parser.add_argument("--sides", default="1024,2048,4000")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = generate(args.folder, args.scenes, args.burst, [int(s) for s in args.sides.split(",")], args.seed)
+    print(f"{len(paths)} images in {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Cold-start import budget for each entry point.
+
+    python -m benchmarks.import_budget [--repeat 3] [--scale 1.0]
+
+Imports every entry point in a fresh interpreter, `-X importtime` style, and
+fails (exit status 1) when its import takes longer than its budget or loads
+one of the heavy backends that are only supposed to be imported on first use.
+Budgets are for a typical laptop; --scale stretches them on slower machines.
+The deferred-import part also runs with the tests (tests/test_import_budget.py).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use by the stages that need them (see core.pipeline.STAGE_BACKENDS)
+DEFERRED = ("mediapipe", "face_recognition", "dlib", "imagehash", "scipy", "qtmodern")
+
+# module -> (budget in ms, modules it may not load)
+ENTRY_POINTS = {
+    "core.pipeline": (400, DEFERRED + ("PyQt5", "fastapi")),
+    "main": (500, DEFERRED + ("PyQt5", "fastapi")),
+    "api.main": (1500, DEFERRED + ("PyQt5",)),
+    "gui_main": (1500, DEFERRED + ("fastapi",)),
+}
+
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(elapsed * 1000)\n"
+    "print(','.join(sorted({{name.split('.')[0] for name in sys.modules}})))\n"
+)
+
+
+def measure(module):
+    # A fresh interpreter each time, so nothing is already imported
+    env = dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}")
+    elapsed, loaded = out.stdout.strip().splitlines()[-2:]
+    return float(elapsed), set(loaded.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many cold starts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget by this")
+    parser.add_argument("--only", help="comma-separated entry points")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(ENTRY_POINTS)
+    failures = 0
+    print(f"{'entry point':<16} {'best ms':>9} {'budget ms':>10}  result")
+    for name in names:
+        budget, forbidden = ENTRY_POINTS[name]
+        budget *= args.scale
+        try:
+            runs = [measure(name) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{name:<16} {'-':>9} {budget:10.0f}  skipped ({e})")
+            continue
+        best = min(elapsed for elapsed, _ in runs)
+        eager = sorted(set(forbidden) & runs[0][1])
+        problems = []
+        if best > budget:
+            problems.append("over budget")
+        if eager:
+            problems.append("imports " + ", ".join(eager))
+        failures += bool(problems)
+        print(f"{name:<16} {best:9.0f} {budget:10.0f}  {'; '.join(problems) or 'ok'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""Benchmark suite: every analysis stage, the index lookups, the end-to-end
+cull and the API under concurrent load, on the synthetic corpus.
+
+    python -m benchmarks.suite [--corpus /tmp/ailbums_corpus] [--output results.json]
+                               [--baseline old.json --tolerance 0.10]
+
+Per-call latencies give p50/p90/p99/max; throughput is calls (or images) per
+second of wall time. The end-to-end cull runs `main.py cull` and the API test
+runs uvicorn in subprocesses so their peak RSS is measured on their own. Stages
+whose dependencies are missing are reported as skipped. With --baseline, any
+benchmark whose p50 rose or whose throughput fell by more than the tolerance
+is flagged and the exit status is 1.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.corpus import generate
+from utils.image_loader import load_image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(tempfile.gettempdir(), "ailbums_corpus")
+
+# name -> (module, function, module constant holding the side it analyzes at)
+STAGES = {
+    "blur": ("core.sorter", "get_blur_score", "BLUR_SIDE"),
+    "exposure": ("core.analyzer", "analyze_exposure", "EXPOSURE_SIDE"),
+    "metrics": ("core.metrics", "compute_metrics", None),
+    "sharpness": ("core.sharpness", "analyze_sharpness", "BLUR_SIDE"),
+    "face_attributes": ("core.face_filter", "detect_face_attributes", "FACE_SIDE"),
+    "embedding": ("core.face_cluster", "get_face_embedding", "EMBEDDING_SIDE"),
+    "hash": ("core.face_cluster", "get_image_hash", "HASH_SIDE"),
+    "faces": ("core.faces", "analyze_faces", "FACES_SIDE"),
+}
+
+
+def summarize(latencies, wall=None, count=None, rss_kb=None):
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000
+    wall = float(latencies.sum() / 1000) if wall is None else wall
+    count = len(latencies) if count is None else count
+    p50, p90, p99 = np.percentile(latencies, (50, 90, 99)) if len(latencies) else (None, None, None)
+    return {
+        "n": count,
+        "total_s": round(wall, 4),
+        "throughput": round(count / wall, 2) if wall else None,
+        "p50_ms": p50,
+        "p90_ms": p90,
+        "p99_ms": p99,
+        "max_ms": float(latencies.max()) if len(latencies) else None,
+        "peak_rss_mb": round(rss_kb / 1024, 1) if rss_kb else None,
+    }
+
+
+def per_call(func, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_decode(paths, side):
+    return summarize(per_call(lambda path: load_image(path, side), paths))
+
+
+def bench_stages(paths, names):
+    results = {}
+    decoded = {}
+    for name in names:
+        module_name, func_name, side_name = STAGES[name]
+        try:
+            module = importlib.import_module(module_name)
+            func = getattr(module, func_name)
+            side = getattr(module, side_name) if side_name else None
+            # Decode at the side the stage asks for, as the pipeline does, outside the timing
+            if side not in decoded:
+                decoded[side] = [load_image(path, side) for path in paths]
+            # The first call imports the stage's backend and loads its models
+            func(decoded[side][0])
+        except Exception as e:  # ImportError, or a native library failing to load
+            results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+            continue
+        results[name] = summarize(per_call(func, decoded[side]))
+    return results
+
+
+def bench_indexes(size, queries, seed=0):
+    try:
+        from core.face_cluster import PhashIndex, EmbeddingIndex
+    except Exception as e:
+        skipped = {"skipped": f"{type(e).__name__}: {e}"}
+        return {"phash_index": skipped, "embedding_index": skipped}
+
+    rng = np.random.default_rng(seed)
+    results = {}
+    hashes = [int(h) for h in rng.integers(0, 2**63, size, dtype=np.int64, endpoint=False)]
+    start = time.perf_counter()
+    index = PhashIndex.build(hashes)
+    build = time.perf_counter() - start
+    # Half the probes are near-duplicates of stored hashes, half random
+    near = zip(rng.integers(0, size, queries // 2), rng.integers(0, 64, queries // 2))
+    probes = [hashes[i] ^ (1 << int(bit)) for i, bit in near]
+    probes += [int(h) for h in rng.integers(0, 2**63, queries - len(probes), dtype=np.int64)]
+    results["phash_index"] = dict(summarize(per_call(lambda h: index.contains(h, 5), probes)), build_s=round(build, 4))
+
+    vectors = rng.normal(0, 1, (size, 128))
+    vectors *= 0.35 / np.linalg.norm(vectors, axis=1, keepdims=True)
+    embeddings = EmbeddingIndex()
+    start = time.perf_counter()
+    embeddings.add_many(vectors)
+    build = time.perf_counter() - start
+    probes = vectors[rng.integers(0, size, queries)] + rng.normal(0, 0.01, (queries, 128))
+    results["embedding_index"] = dict(summarize(per_call(lambda e: embeddings.contains(e, 0.6), probes)), build_s=round(build, 4))
+    return results
+
+
+def bench_cull(corpus_paths, workers, repeat):
+    latencies = []
+    peak_kb = 0
+    for _ in range(repeat):
+        # A fresh copy each time: the cull writes its journal, manifest and sidecars into the folder
+        with tempfile.TemporaryDirectory(prefix="ailbums_cull_") as folder:
+            for path in corpus_paths:
+                shutil.copy(path, folder)
+            command = [sys.executable, os.path.join(ROOT, "main.py"), "cull", folder,
+                       "--no-cache", "--fresh", "--export-mode", "manifest", "--limit", str(len(corpus_paths))]
+            if workers:
+                command += ["--workers", str(workers)]
+            start = time.perf_counter()
+            process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            stderr = process.stderr.read()
+            # ru_maxrss of the main process or its largest waited-for worker, in KiB on Linux
+            _, status, usage = os.wait4(process.pid, 0)
+            latencies.append(time.perf_counter() - start)
+            code = os.waitstatus_to_exitcode(status)
+            if code:
+                return {"skipped": f"cull exited with {code}: {stderr.decode(errors='replace')[-500:]}"}
+            peak_kb = max(peak_kb, usage.ru_maxrss)
+    result = summarize(latencies, wall=sum(latencies), count=len(corpus_paths) * repeat, rss_kb=peak_kb)
+    result["runs"] = repeat
+    return result
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _multipart(filename, data):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def _post(url, filename, data):
+    body, content_type = _multipart(filename, data)
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - start, status
+
+
+def _peak_rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def bench_api(corpus_paths, concurrency, requests):
+    if importlib.util.find_spec("uvicorn") is None:
+        return {"skipped": "ImportError: No module named 'uvicorn'"}
+    port = _free_port()
+    with tempfile.TemporaryDirectory(prefix="ailbums_api_") as tmp:
+        # A private cache so every request is actually analyzed
+        env = dict(os.environ, AILBUMS_CACHE=os.path.join(tmp, "cache.sqlite3"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                if server.poll() is not None:
+                    return {"skipped": f"server exited: {server.stderr.read().decode(errors='replace')[-500:]}"}
+                try:
+                    with socket.create_connection(("127.0.0.1", port), timeout=1):
+                        break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        return {"skipped": "server did not start"}
+                    time.sleep(0.1)
+
+            uploads = []
+            for path in corpus_paths:
+                with open(path, "rb") as f:
+                    uploads.append((os.path.basename(path), f.read()))
+            # Distinct bytes per request (trailing bytes after the JPEG end marker) so none is a cache hit
+            work = []
+            for i in range(requests):
+                name, data = uploads[i % len(uploads)]
+                work.append((name, data + i.to_bytes(4, "big")))
+            url = f"http://127.0.0.1:{port}/cull"
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                responses = list(pool.map(lambda item: _post(url, *item), work))
+            wall = time.perf_counter() - start
+            rss_kb = _peak_rss_kb(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    latencies = [latency for latency, status in responses if status == 200]
+    result = summarize(latencies, wall=wall, count=len(latencies), rss_kb=rss_kb)
+    result["concurrency"] = concurrency
+    result["errors"] = {str(s): sum(1 for _, st in responses if st == s) for s in {st for _, st in responses if st != 200}}
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (name, metric, baseline, current) that moved the wrong way by
+    more than `tolerance`."""
+    regressions = []
+    for name, current in results.items():
+        old = baseline.get(name)
+        if not old or "skipped" in old or "skipped" in current:
+            continue
+        if old.get("p50_ms") and current.get("p50_ms") and current["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+            regressions.append((name, "p50_ms", old["p50_ms"], current["p50_ms"]))
+        if old.get("throughput") and current.get("throughput") and current["throughput"] < old["throughput"] * (1 - tolerance):
+            regressions.append((name, "throughput", old["throughput"], current["throughput"]))
+    return regressions
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else "-".rjust(int(spec.split(".")[0]))
+
+
+def print_table(results):
+    print(f"{'benchmark':<22} {'n':>6} {'/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'RSS MB':>8}")
+    for name, r in results.items():
+        if "skipped" in r:
+            print(f"{name:<22} skipped ({r['skipped'].splitlines()[0][:60]})")
+            continue
+        print(f"{name:<22} {r['n']:>6} {_fmt(r['throughput'], '9.1f')} {_fmt(r['p50_ms'], '9.2f')} "
+              f"{_fmt(r['p90_ms'], '9.2f')} {_fmt(r['p99_ms'], '9.2f')} {_fmt(r['max_ms'], '9.2f')} "
+              f"{_fmt(r['peak_rss_mb'], '8.1f')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="corpus folder (generated if missing)")
+    parser.add_argument("--scenes", type=int, default=12)
+    parser.add_argument("--burst", type=int, default=4)
+    parser.add_argument("--sides", default="1024,2048,4000")
+    parser.add_argument("--only", help="comma-separated subset: decode,stages,indexes,cull,api")
+    parser.add_argument("--stages", default=",".join(STAGES), help="analyzers to time")
+    parser.add_argument("--index-size", type=int, default=20000)
+    parser.add_argument("--index-queries", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=0, help="cull workers (default: all cores)")
+    parser.add_argument("--repeat", type=int, default=1, help="end-to-end cull runs")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=0, help="API requests (default: one per image)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    sides = [int(s) for s in args.sides.split(",")]
+    paths = generate(args.corpus, args.scenes, args.burst, sides)
+    only = set(args.only.split(",")) if args.only else {"decode", "stages", "indexes", "cull", "api"}
+    print(f"{len(paths)} images in {args.corpus}")
+
+    results = {}
+    if "decode" in only:
+        results["decode_full"] = bench_decode(paths, None)
+        results["decode_1024"] = bench_decode(paths, 1024)
+    if "stages" in only:
+        results.update(bench_stages(paths, [s for s in args.stages.split(",") if s]))
+    if "indexes" in only:
+        results.update(bench_indexes(args.index_size, args.index_queries))
+    if "cull" in only:
+        results["cull_e2e"] = bench_cull(paths, args.workers, args.repeat)
+    if "api" in only:
+        results["api_cull"] = bench_api(paths, args.concurrency, args.requests or len(paths))
+    print_table(results)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": {"scenes": args.scenes, "burst": args.burst, "sides": sides, "images": len(paths)},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=float)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("corpus") != report["meta"]["corpus"]:
+            print("\nWarning: the baseline was measured on a different corpus")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.2f} -> {new:.2f}")
+        if regressions:
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,19 @@
-import cv2
-import numpy as np
-from scipy import stats
+from core.metrics import compute_metrics, histogram_shape
+from utils.image_loader import resize_to_side
+from utils.instrumentation import instrumented
 
-def analyze_exposure(image):
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Calculate histogram
-    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-    
-    # Normalize histogram
-    hist = hist.ravel() / hist.sum()
-    
-    # Calculate mean and std of pixel values
-    mean = np.mean(gray)
-    std = np.std(gray)
-    
-    # Calculate histogram peaks
-    peaks = stats.find_peaks(hist)[0]
+# Mean/histogram statistics don't change meaningfully below this size
+EXPOSURE_SIDE = 512
+
+@instrumented("exposure")
+def analyze_exposure(image, metrics=None):
+    # Pass `metrics` from compute_metrics to reuse an existing grayscale pass
+    if metrics is None:
+        metrics = compute_metrics(resize_to_side(image, EXPOSURE_SIDE))
+    mean = metrics["mean"]
+    std = metrics["std"]
+    peaks = metrics["peaks"]
+    shape = histogram_shape(metrics["hist"])
     
     # Determine exposure quality
     if mean < 60:
@@ -31,7 +27,10 @@ def analyze_exposure(image):
         "quality": quality,
         "mean": mean,
         "std": std,
-        "peaks": len(peaks)
+        "peaks": peaks,
+        "shadows_clipped": float(shape["shadows_clipped"]),
+        "highlights_clipped": float(shape["highlights_clipped"]),
+        "dynamic_range": int(shape["dynamic_range"]),
     }
 
 def calculate_image_score(blur_score, face_attributes, exposure_data):
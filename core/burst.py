@@ -0,0 +1,151 @@
+import calendar
+from datetime import datetime
+from PIL import Image
+from core.face_filter import summarize_faces
+from core.pipeline import LazyResult
+from core.sharpness import sort_score
+
+# EXIF tags; PIL reads these from the header without decoding pixels
+EXIF_IFD = 0x8769
+MAKE = 0x010F
+MODEL = 0x0110
+DATETIME = 0x0132
+DATETIME_ORIGINAL = 0x9003
+SUBSEC_TIME_ORIGINAL = 0x9291
+BODY_SERIAL_NUMBER = 0xA431
+
+# Frames from the same body closer than this belong to one burst. Continuous
+# shooting ranges from about 3 fps (333 ms between frames) to 20 fps (50 ms),
+# so 400 ms still chains the slowest burst modes while two separate shots
+# a beat apart stay apart. Without SubSecTimeOriginal, timestamps are whole
+# seconds and only frames stamped with the same second are grouped
+DEFAULT_GAP_MS = 400
+
+
+def _parse_time(stamp, subsec):
+    try:
+        moment = datetime.strptime(str(stamp).strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    # timegm keeps local-time stamps monotonic regardless of DST on this machine
+    seconds = float(calendar.timegm(moment.timetuple()))
+    digits = "".join(c for c in str(subsec or "") if c.isdigit())
+    if digits:
+        seconds += int(digits) / 10 ** len(digits)
+    return seconds
+
+
+def read_capture_info(path):
+    info = {"path": path, "time": None, "camera": None}
+    try:
+        with Image.open(path) as img:
+            exif = img.getexif()
+            ifd = exif.get_ifd(EXIF_IFD)
+    except Exception:
+        # Unreadable or corrupt EXIF: the frame just isn't part of any burst
+        return info
+    stamp = ifd.get(DATETIME_ORIGINAL) or exif.get(DATETIME)
+    if stamp:
+        info["time"] = _parse_time(stamp, ifd.get(SUBSEC_TIME_ORIGINAL))
+    serial = ifd.get(BODY_SERIAL_NUMBER)
+    make, model = exif.get(MAKE), exif.get(MODEL)
+    if serial or make or model:
+        info["camera"] = "/".join(str(v).strip("\x00 ") for v in (make, model, serial) if v)
+    return info
+
+
+def group_bursts(paths, gap_ms=DEFAULT_GAP_MS):
+    """Split paths into bursts: per camera, time-ordered runs of frames with
+    gaps of at most gap_ms. Frames without a capture time are left out of every
+    burst; see burst_ids."""
+    by_camera = {}
+    for path in paths:
+        info = read_capture_info(path)
+        if info["time"] is not None:
+            by_camera.setdefault(info["camera"], []).append(info)
+
+    bursts = []
+    gap = gap_ms / 1000.0
+    for frames in by_camera.values():
+        frames.sort(key=lambda info: info["time"])
+        current = [frames[0]]
+        for info in frames[1:]:
+            if info["time"] - current[-1]["time"] > gap:
+                bursts.append(current)
+                current = []
+            current.append(info)
+        bursts.append(current)
+    return [[info["path"] for info in burst] for burst in bursts]
+
+
+def burst_ids(paths, gap_ms=DEFAULT_GAP_MS):
+    # path -> burst number. Single frames and frames with no EXIF time get None
+    # and are compared against each other as one shared pool
+    paths = list(paths)
+    ids = dict.fromkeys(paths)
+    bursts = [burst for burst in group_bursts(paths, gap_ms) if len(burst) > 1]
+    for number, burst in enumerate(bursts):
+        for path in burst:
+            ids[path] = number
+    return ids
+
+
+def _stage(result, name):
+    # A LazyResult computes a missing stage on access; a plain dict just lacks it
+    try:
+        return result[name]
+    except KeyError:
+        return None
+
+
+def burst_rank(result):
+    # Eyes open beats smiling beats sharpness. Sharpness is that of the eyes
+    # when a face was found, so focus on the subject wins over a sharp background
+    attributes = summarize_faces(_stage(result, "faces") or [])
+    # Measured here if the result lacks it, then picked up by sort_score
+    _stage(result, "face_focus")
+    return (attributes["eyes_open"], attributes["smiling"], sort_score(result) or 0.0)
+
+
+def best_of_burst(results):
+    # results need "faces" and "face_focus", "sharpness" or "blur", or be LazyResults
+    return max(results, key=burst_rank) if results else None
+
+
+def burst_order(paths, ids):
+    # paths with each burst's frames moved up behind its first one, so the
+    # burst reaches the reducer as one run that best_first() can rank
+    runs = {}
+    order = []
+    for path in paths:
+        burst = ids.get(path)
+        if burst is None:
+            order.append([path])
+        elif burst not in runs:
+            runs[burst] = [path]
+            order.append(runs[burst])
+        else:
+            runs[burst].append(path)
+    return [path for run in order for path in run]
+
+
+def best_first(results, ids):
+    """Re-sequences results that arrive in burst_order() so each burst's
+    frames come out best_of_burst() first; the reducer then keeps that frame
+    and rejects the rest of the burst as its duplicates. Frames outside any
+    burst pass straight through. Burst frames are wrapped in LazyResult so
+    faces and sharpness missing from `results` are computed for the ranking."""
+    run = []
+    current = None
+    for result in results:
+        burst = ids.get(result["path"])
+        if run and burst != current:
+            # sorted() is stable, so ties keep their sharpness order
+            yield from sorted(run, key=burst_rank, reverse=True)
+            run = []
+        current = burst
+        if burst is None:
+            yield result
+        else:
+            run.append(result if isinstance(result, LazyResult) else LazyResult(result))
+    yield from sorted(run, key=burst_rank, reverse=True)
@@ -0,0 +1,112 @@
+import time
+
+
+class Stage:
+    """One filter of a cascade.
+
+    check(item) returns (reject, reasons). commit(item), if given, records the
+    item in the stage's state (e.g. the seen-hash index); it runs only when
+    this stage and every stage before it in canonical order passed. Stages must
+    not read each other's state, which is what makes reordering safe."""
+
+    def __init__(self, name, check, commit=None):
+        self.name = name
+        self.check = check
+        self.commit = commit
+        self.index = None
+
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.rejects = 0
+        self.seconds = 0.0
+
+    @property
+    def mean_seconds(self):
+        return self.seconds / self.calls if self.calls else 0.0
+
+    @property
+    def reject_rate(self):
+        return self.rejects / self.calls if self.calls else 0.0
+
+
+class FilterCascade:
+    """Runs stages cheapest-per-rejection first and stops once the outcome is known.
+
+    Stages are given in canonical order (the order whose results we must
+    reproduce). The run order is re-ranked every `reorder_every` items by mean
+    cost divided by rejection rate. Once a stage rejects, only stages still
+    needed to decide which earlier commits happen are evaluated, so the
+    approved/rejected outcome and the committed state are identical to running
+    the canonical order in full."""
+
+    def __init__(self, stages, adaptive=True, reorder_every=25):
+        self.stages = list(stages)
+        for index, stage in enumerate(self.stages):
+            stage.index = index
+        self.order = list(self.stages)
+        self.stats = {stage.name: StageStats() for stage in self.stages}
+        self.adaptive = adaptive
+        self.reorder_every = reorder_every
+        self.items = 0
+
+    def _last_needed(self, first_reject):
+        # Highest canonical index whose commit still depends on unevaluated stages
+        committing = [s.index for s in self.stages if s.commit is not None and s.index < first_reject]
+        return max(committing, default=-1)
+
+    def run(self, item):
+        first_reject = len(self.stages)
+        needed = len(self.stages) - 1
+        reasons = []
+
+        for stage in self.order:
+            if stage.index > needed:
+                continue
+            stats = self.stats[stage.name]
+            start = time.perf_counter()
+            reject, stage_reasons = stage.check(item)
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            reasons.extend(stage_reasons)
+            if reject:
+                stats.rejects += 1
+                if stage.index < first_reject:
+                    first_reject = stage.index
+                    needed = self._last_needed(first_reject)
+
+        for stage in self.stages:
+            if stage.index >= first_reject:
+                break
+            if stage.commit is not None:
+                stage.commit(item)
+
+        self.items += 1
+        if self.adaptive and self.items % self.reorder_every == 0:
+            self.reorder()
+        return first_reject == len(self.stages), reasons
+
+    def reorder(self):
+        def rank(stage):
+            stats = self.stats[stage.name]
+            if not stats.calls:
+                return (0, 0.0, stage.index)
+            if not stats.rejects:
+                return (2, stats.mean_seconds, stage.index)
+            return (1, stats.mean_seconds / stats.reject_rate, stage.index)
+
+        self.order = sorted(self.stages, key=rank)
+
+    def report(self):
+        return [
+            {
+                "stage": stage.name,
+                "calls": self.stats[stage.name].calls,
+                "rejects": self.stats[stage.name].rejects,
+                "reject_rate": self.stats[stage.name].reject_rate,
+                "mean_ms": self.stats[stage.name].mean_seconds * 1000,
+                "total_s": self.stats[stage.name].seconds,
+            }
+            for stage in self.order
+        ]
@@ -1,16 +1,278 @@
-import face_recognition
+import importlib
 import numpy as np
-from PIL import Image
-import imagehash
+from core.hashing import phash
+from utils.image_loader import resize_to_side
+from utils.instrumentation import instrumented
 
-def get_face_embedding(image):
+# dlib's HOG detector needs faces of roughly 80px, keep enough for group shots
+EMBEDDING_SIDE = 1280
+# phash downsamples to 32x32 anyway
+HASH_SIDE = 256
+
+# Heavy libraries (face_recognition loads dlib's models at import, mediapipe
+# takes seconds) are imported on first use rather than with their modules
+_backends = {}
+
+def backend(name):
+    module = _backends.get(name)
+    if module is None:
+        module = _backends[name] = importlib.import_module(name)
+    return module
+
+@instrumented("face_encoding")
+def get_face_embeddings(image, face_locations=None):
+    # face_locations are (top, right, bottom, left) boxes in `image` pixels;
+    # passing them skips dlib's own HOG detection pass
+    height = image.shape[0]
+    image = resize_to_side(image, EMBEDDING_SIDE)
+    if face_locations is not None:
+        if not face_locations:
+            return []
+        scale = image.shape[0] / height
+        face_locations = [tuple(int(v * scale) for v in box) for box in face_locations]
     rgb_img = image[:, :, ::-1]  # BGR to RGB
-    encodings = face_recognition.face_encodings(rgb_img)
+    return backend("face_recognition").face_encodings(rgb_img, known_face_locations=face_locations)
+
+@instrumented("embedding")
+def get_face_embedding(image, face_locations=None):
+    encodings = get_face_embeddings(image, face_locations)
     return encodings[0] if encodings else None
 
+@instrumented("phash")
 def get_image_hash(image):
-    pil_img = Image.fromarray(image[:, :, ::-1])  # BGR to RGB
-    return imagehash.phash(pil_img)
+    # Packed int, bit for bit what imagehash.phash gives for the same pixels
+    return phash(resize_to_side(image, HASH_SIDE))
 
 def are_images_duplicates(hash1, hash2, threshold=5):
-    return abs(hash1 - hash2) <= threshold
+    return hamming_distance(hash1, hash2) <= threshold
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value):
+        return bin(value).count("1")
+
+def hash_to_int(img_hash):
+    # Packs an ImageHash into an int, MSB first, so int(str(h), 16) == hash_to_int(h)
+    if isinstance(img_hash, (int, np.integer)):
+        return int(img_hash)
+    bits = np.asarray(img_hash.hash, dtype=bool).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming_distance(hash1, hash2):
+    return _popcount(hash_to_int(hash1) ^ hash_to_int(hash2))
+
+
+class PhashIndex:
+    """BK-tree over packed perceptual hashes for Hamming radius queries.
+
+    Nodes are [hash, items, children] lists with children keyed by their
+    distance to the parent, so a radius query only descends into children
+    whose edge distance lies within [d - radius, d + radius]."""
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @classmethod
+    def build(cls, hashes, items=None):
+        index = cls()
+        if items is None:
+            items = [None] * len(hashes)
+        for img_hash, item in zip(hashes, items):
+            index.insert(img_hash, item)
+        return index
+
+    def insert(self, img_hash, item=None):
+        key = hash_to_int(img_hash)
+        self._size += 1
+        if self._root is None:
+            self._root = [key, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = _popcount(key ^ node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, [item], {}]
+                return
+            node = child
+
+    def _search(self, key, radius):
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = _popcount(key ^ node[0])
+            if distance <= radius:
+                yield node, distance
+            low, high = distance - radius, distance + radius
+            for edge, child in node[2].items():
+                if low <= edge <= high:
+                    stack.append(child)
+
+    def query(self, img_hash, radius=5):
+        matches = []
+        for node, distance in self._search(hash_to_int(img_hash), radius):
+            matches.extend((item, distance) for item in node[1])
+        return matches
+
+    def contains(self, img_hash, radius=5):
+        for _ in self._search(hash_to_int(img_hash), radius):
+            return True
+        return False
+
+
+class EmbeddingIndex:
+    """Face embeddings in one contiguous float32 matrix that grows by doubling.
+
+    Distance queries are a single matrix product against the whole gallery.
+    With approximate=True, random-hyperplane LSH tables narrow each query down
+    to candidates sharing a bucket before the exact distance check."""
+
+    def __init__(self, dim=128, capacity=256, approximate=False, planes=12, tables=4, seed=0):
+        self.dim = dim
+        # Doubling never grows an empty buffer
+        capacity = max(capacity, 1)
+        self._data = np.empty((capacity, dim), dtype=np.float32)
+        self._sq_norms = np.empty(capacity, dtype=np.float32)
+        self._size = 0
+        self.approximate = approximate
+        if approximate:
+            rng = np.random.default_rng(seed)
+            self._planes = rng.standard_normal((tables, dim, planes)).astype(np.float32)
+            self._weights = 1 << np.arange(planes, dtype=np.int64)
+            self._buckets = [{} for _ in range(tables)]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def embeddings(self):
+        return self._data[:self._size]
+
+    def _grow(self, needed):
+        capacity = len(self._data)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        data = np.empty((capacity, self.dim), dtype=np.float32)
+        data[:self._size] = self._data[:self._size]
+        sq_norms = np.empty(capacity, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._data, self._sq_norms = data, sq_norms
+
+    def _codes(self, vectors):
+        # (tables, n) bucket codes from the sign of each hyperplane projection
+        signs = np.einsum("nd,tdp->tnp", vectors, self._planes) > 0
+        return signs.astype(np.int64) @ self._weights
+
+    def add(self, embedding):
+        return int(self.add_many([embedding])[0])
+
+    def add_many(self, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        start = self._size
+        self._grow(start + len(vectors))
+        self._data[start:start + len(vectors)] = vectors
+        self._sq_norms[start:start + len(vectors)] = np.einsum("nd,nd->n", vectors, vectors)
+        self._size += len(vectors)
+        ids = np.arange(start, self._size)
+        if self.approximate:
+            for table, codes in zip(self._buckets, self._codes(vectors)):
+                for code, idx in zip(codes.tolist(), ids.tolist()):
+                    table.setdefault(code, []).append(idx)
+        return ids
+
+    def distances(self, queries, ids=None):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        data = self.embeddings if ids is None else self._data[ids]
+        sq_norms = self._sq_norms[:self._size] if ids is None else self._sq_norms[ids]
+        sq = np.einsum("nd,nd->n", queries, queries)[:, None] + sq_norms[None, :] - 2.0 * (queries @ data.T)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def nearest_many(self, queries):
+        # Returns (ids, distances); id is -1 and distance inf when nothing is indexed
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.full(len(queries), -1, dtype=np.int64)
+        dists = np.full(len(queries), np.inf, dtype=np.float32)
+        if not self._size or not len(queries):
+            return ids, dists
+        if not self.approximate:
+            matrix = self.distances(queries)
+            ids = matrix.argmin(axis=1)
+            return ids, matrix[np.arange(len(queries)), ids]
+        codes = self._codes(queries)
+        for i in range(len(queries)):
+            candidates = set()
+            for table, code in zip(self._buckets, codes[:, i].tolist()):
+                candidates.update(table.get(code, ()))
+            if candidates:
+                candidates = np.fromiter(candidates, dtype=np.int64)
+                row = self.distances(queries[i], candidates)[0]
+                best = row.argmin()
+                ids[i], dists[i] = candidates[best], row[best]
+        return ids, dists
+
+    def nearest(self, embedding):
+        ids, dists = self.nearest_many([embedding])
+        if ids[0] < 0:
+            return None, float("inf")
+        return int(ids[0]), float(dists[0])
+
+    def contains(self, embedding, threshold=0.6):
+        return self.nearest(embedding)[1] < threshold
+
+
+def cluster_embeddings(embeddings, threshold=0.6, iterations=20, seed=0, block=1024):
+    """Group a whole shoot's face embeddings into people (chinese whispers).
+
+    Returns one integer label per embedding; equal labels mean same person."""
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    count = len(vectors)
+    if not count:
+        return np.empty(0, dtype=np.int64)
+
+    # Neighbour lists built block by block to keep the distance matrix small
+    index = EmbeddingIndex(dim=vectors.shape[1], capacity=count)
+    index.add_many(vectors)
+    neighbours = []
+    weights = []
+    for start in range(0, count, block):
+        matrix = index.distances(vectors[start:start + block])
+        for offset, row in enumerate(matrix):
+            idx = np.flatnonzero(row < threshold)
+            idx = idx[idx != start + offset]
+            neighbours.append(idx)
+            weights.append(1.0 / (1.0 + row[idx]))
+
+    labels = np.arange(count)
+    rng = np.random.default_rng(seed)
+    for _ in range(iterations):
+        changed = False
+        for node in rng.permutation(count):
+            idx = neighbours[node]
+            if not len(idx):
+                continue
+            votes = {}
+            for label, weight in zip(labels[idx].tolist(), weights[node].tolist()):
+                votes[label] = votes.get(label, 0.0) + weight
+            best = max(votes, key=votes.get)
+            if best != labels[node]:
+                labels[node] = best
+                changed = True
+        if not changed:
+            break
+
+    # Renumber labels to 0..k-1 in order of first appearance
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first))
+    return order[inverse]
@@ -1,33 +1,114 @@
-import mediapipe as mp
 import cv2
 import numpy as np
+import threading
+from core.face_cluster import backend
+from utils.image_loader import resize_to_side
+from utils.instrumentation import instrumented
 
-mp_face_mesh = mp.solutions.face_mesh
+# FaceMesh works on normalized coordinates and crops faces to 192px internally
+FACE_SIDE = 1024
 
+# Enough for group shots; every detected face is scored
+MAX_FACES = 10
+
+NO_FACE = {"eyes_open": False, "smiling": False}
+
+def face_box(face_landmarks, width, height):
+    # (top, right, bottom, left) in pixels, the layout face_recognition expects
+    points = np.array([(lm.x, lm.y) for lm in face_landmarks.landmark])
+    left, top = points.min(axis=0)
+    right, bottom = points.max(axis=0)
+    return (
+        max(0, int(top * height)),
+        min(width, int(right * width)),
+        min(height, int(bottom * height)),
+        max(0, int(left * width)),
+    )
+
+
+def face_attributes(face_landmarks):
+    # Eye landmarks
+    left_eye_top = face_landmarks.landmark[159].y
+    left_eye_bottom = face_landmarks.landmark[145].y
+    right_eye_top = face_landmarks.landmark[386].y
+    right_eye_bottom = face_landmarks.landmark[374].y
+
+    left_eye_open = abs(left_eye_top - left_eye_bottom) > 0.01
+    right_eye_open = abs(right_eye_top - right_eye_bottom) > 0.01
+
+    # Smile (check distance between top and bottom lips)
+    upper_lip = face_landmarks.landmark[13].y
+    lower_lip = face_landmarks.landmark[14].y
+    mouth_open = abs(upper_lip - lower_lip) > 0.02
+
+    return {
+        "eyes_open": left_eye_open and right_eye_open,
+        "smiling": mouth_open,
+    }
+
+
+def summarize_faces(faces):
+    # A group shot needs everyone's eyes open and most people smiling
+    if not faces:
+        return dict(NO_FACE, faces=0)
+    smiling = sum(1 for face in faces if face["smiling"])
+    return {
+        "eyes_open": all(face["eyes_open"] for face in faces),
+        "smiling": smiling * 2 >= len(faces),
+        "faces": len(faces),
+    }
+
+
+class FaceAttributeDetector:
+    """Owns one FaceMesh graph so the TFLite model is loaded once, not per image.
+
+    A FaceMesh instance is not thread safe; use get_detector() to get the one
+    belonging to the current thread (and therefore the current process)."""
+
+    def __init__(self, max_faces=MAX_FACES):
+        # mediapipe takes seconds to import, so it's only loaded once faces are analyzed
+        self.face_mesh = backend("mediapipe").solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=max_faces)
+
+    @instrumented("facemesh")
+    def detect_faces(self, image):
+        # Landmarks are normalized, so boxes map straight back to the caller's image size
+        height, width = image.shape[:2]
+        small = resize_to_side(image, FACE_SIDE)
+        results = self.face_mesh.process(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        faces = []
+        for face_landmarks in results.multi_face_landmarks or []:
+            face = face_attributes(face_landmarks)
+            face["box"] = face_box(face_landmarks, width, height)
+            face["frame"] = [height, width]
+            faces.append(face)
+        return faces
+
+    def detect(self, image):
+        return summarize_faces(self.detect_faces(image))
+
+    def detect_many(self, images):
+        return [self.detect(image) for image in images]
+
+    def close(self):
+        self.face_mesh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_local = threading.local()
+
+
+def get_detector():
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = _local.detector = FaceAttributeDetector()
+    return detector
+
+
+@instrumented("face_attributes")
 def detect_face_attributes(image):
-    with mp_face_mesh.FaceMesh(static_image_mode=True) as face_mesh:
-        results = face_mesh.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        if not results.multi_face_landmarks:
-            return {"eyes_open": False, "smiling": False}
-
-        for face_landmarks in results.multi_face_landmarks:
-            # Eye landmarks
-            left_eye_top = face_landmarks.landmark[159].y
-            left_eye_bottom = face_landmarks.landmark[145].y
-            right_eye_top = face_landmarks.landmark[386].y
-            right_eye_bottom = face_landmarks.landmark[374].y
-
-            left_eye_open = abs(left_eye_top - left_eye_bottom) > 0.01
-            right_eye_open = abs(right_eye_top - right_eye_bottom) > 0.01
-
-            # Smile (check distance between top and bottom lips)
-            upper_lip = face_landmarks.landmark[13].y
-            lower_lip = face_landmarks.landmark[14].y
-            mouth_open = abs(upper_lip - lower_lip) > 0.02
-
-            return {
-                "eyes_open": left_eye_open and right_eye_open,
-                "smiling": mouth_open,
-            }
-
-        return {"eyes_open": False, "smiling": False}
+    return get_detector().detect(image)
@@ -0,0 +1,38 @@
+from core.face_filter import get_detector, FACE_SIDE
+from core.face_cluster import get_face_embeddings, EMBEDDING_SIDE
+from utils.image_loader import resize_to_side
+from utils.instrumentation import instrumented
+
+FACES_SIDE = max(FACE_SIDE, EMBEDDING_SIDE)
+
+
+@instrumented("faces")
+def analyze_faces(image, embeddings=True):
+    # One detection pass per image: FaceMesh finds every face, its boxes feed
+    # both the eye/smile checks and face_recognition's encoder
+    image = resize_to_side(image, FACES_SIDE)
+    faces = get_detector().detect_faces(image)
+    if embeddings and faces:
+        encodings = get_face_embeddings(image, [face["box"] for face in faces])
+        for face, encoding in zip(faces, encodings):
+            face["embedding"] = encoding
+    return faces
+
+
+def encode_faces(image, faces):
+    # Encodings for faces analyze_faces(..., embeddings=False) found, possibly
+    # on a copy of the image at another size; their boxes are scaled to `image`
+    if not faces:
+        return []
+    height, width = image.shape[:2]
+    boxes = []
+    for face in faces:
+        frame_height, frame_width = face.get("frame") or (height, width)
+        sy, sx = height / frame_height, width / frame_width
+        top, right, bottom, left = face["box"]
+        boxes.append((int(top * sy), int(right * sx), int(bottom * sy), int(left * sx)))
+    return get_face_embeddings(image, boxes)
+
+
+def face_embeddings(faces):
+    return [face["embedding"] for face in faces if face.get("embedding") is not None]
@@ -0,0 +1,97 @@
+import numpy as np
+from PIL import Image
+
+# pHash keeps the 8x8 lowest frequencies of a 32x32 DCT, as imagehash.phash does
+HASH_SIZE = 8
+HIGHFREQ_FACTOR = 4
+PHASH_SIDE = HASH_SIZE * HIGHFREQ_FACTOR
+
+
+def dct_matrix(n):
+    # Unnormalized DCT-II, the scipy.fftpack.dct default: y[k] = 2 * sum(x[i] * cos(pi * k * (2i + 1) / 2n))
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    return 2.0 * np.cos(np.pi * k * (2 * i + 1) / (2 * n))
+
+
+# Only the rows for the frequencies that are kept
+_DCT = dct_matrix(PHASH_SIDE)[:HASH_SIZE]
+
+
+def pil_gray(image):
+    """A BGR (or gray) uint8 array as a PIL "L" image. PIL reads the BGR
+    bytes directly and its own luma rounding is used, so the pixels are the
+    ones imagehash sees after Image.convert("L"), without an RGB copy."""
+    if image.ndim == 2:
+        return Image.fromarray(image)
+    height, width = image.shape[:2]
+    return Image.frombuffer("RGB", (width, height), np.ascontiguousarray(image), "raw", "BGR", 0, 1).convert("L")
+
+
+def thumbnail(gray, size):
+    # PIL's Lanczos, whose support widens with the reduction; OpenCV's
+    # INTER_LANCZOS4 is a fixed 8x8 kernel and gives different pixels
+    return np.asarray(gray.resize(size, Image.LANCZOS))
+
+
+def pack_bits(bits):
+    """(N, 64) booleans -> (N,) uint64, first bit most significant, the same
+    packing as face_cluster.hash_to_int."""
+    packed = np.packbits(np.asarray(bits, dtype=bool).reshape(len(bits), -1), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def phash_batch(thumbnails):
+    """pHash of a stack of 32x32 grayscale thumbnails, (N, 32, 32) -> (N,)
+    uint64. Both DCT passes are one batched matrix product, only for the
+    kept 8x8 block."""
+    pixels = np.asarray(thumbnails, dtype=np.float64).reshape(-1, PHASH_SIDE, PHASH_SIDE)
+    low = (_DCT @ pixels @ _DCT.T).reshape(len(pixels), -1)
+    # Frequencies a flat or one-directional image lacks come out of scipy's
+    # FFT as exact zeros but out of the product as ~1e-12 noise, which would
+    # become random bits against a zero median. Rounding only affects
+    # coefficients within 1e-6 of each other.
+    low = np.round(low, 6)
+    median = np.median(low, axis=1, keepdims=True)
+    return pack_bits(low > median)
+
+
+def dhash_batch(thumbnails):
+    """dHash of (N, 8, 9) grayscale thumbnails: is each pixel brighter than
+    its left neighbour."""
+    pixels = np.asarray(thumbnails).reshape(-1, HASH_SIZE, HASH_SIZE + 1)
+    return pack_bits((pixels[:, :, 1:] > pixels[:, :, :-1]).reshape(len(pixels), -1))
+
+
+def ahash_batch(thumbnails):
+    """aHash of (N, 8, 8) grayscale thumbnails: is each pixel above the mean."""
+    pixels = np.asarray(thumbnails).reshape(-1, HASH_SIZE * HASH_SIZE)
+    return pack_bits(pixels > pixels.mean(axis=1, keepdims=True))
+
+
+def hash_images(images, kinds=("phash",)):
+    """Hashes already downscaled images (BGR or gray, e.g. HASH_SIDE
+    thumbnails). Returns {kind: (N,) uint64} for kinds among "phash",
+    "dhash" and "ahash"; pHash equals imagehash.phash of the same pixels.
+    Each image is only shrunk and converted once per kind; the hashing
+    itself runs on the whole batch."""
+    grays = [pil_gray(image) for image in images]
+    sizes = {
+        "phash": (PHASH_SIDE, PHASH_SIDE),
+        "dhash": (HASH_SIZE + 1, HASH_SIZE),
+        "ahash": (HASH_SIZE, HASH_SIZE),
+    }
+    engines = {"phash": phash_batch, "dhash": dhash_batch, "ahash": ahash_batch}
+    hashes = {}
+    for kind in kinds:
+        width, height = sizes[kind]
+        stack = np.empty((len(grays), height, width), dtype=np.uint8)
+        for i, gray in enumerate(grays):
+            stack[i] = thumbnail(gray, (width, height))
+        hashes[kind] = engines[kind](stack)
+    return hashes
+
+
+def phash(image):
+    # Single image convenience, as a packed int
+    return int(hash_images([image])["phash"][0])
@@ -0,0 +1,222 @@
+import cv2
+import numpy as np
+import threading
+from utils.instrumentation import instrumented
+
+LEVELS = np.arange(256, dtype=np.float64)
+
+
+class MetricsScratch:
+    """Grayscale and Laplacian buffers reused between images of the same size."""
+
+    def __init__(self):
+        self.gray = None
+        self.laplacian = None
+
+    def buffers(self, height, width):
+        if self.gray is None or self.gray.shape != (height, width):
+            self.gray = np.empty((height, width), dtype=np.uint8)
+            self.laplacian = np.empty((height, width), dtype=np.float32)
+        return self.gray, self.laplacian
+
+
+_local = threading.local()
+
+
+def get_scratch():
+    scratch = getattr(_local, "scratch", None)
+    if scratch is None:
+        scratch = _local.scratch = MetricsScratch()
+    return scratch
+
+
+def to_gray(image, dst=None):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
+def laplacian_variance(gray, dst=None):
+    # A 3x3 Laplacian of uint8 data is exact in float32; the variance itself
+    # is accumulated in double by meanStdDev
+    laplacian = cv2.Laplacian(gray, cv2.CV_32F, dst=dst)
+    _, std = cv2.meanStdDev(laplacian)
+    return float(std[0, 0]) ** 2
+
+
+def histogram_stats(hist):
+    # Mean and population std straight from the 256-bin histogram, no extra pixel pass
+    hist = np.asarray(hist, dtype=np.float64)
+    total = hist.sum(axis=-1)
+    total = np.where(total > 0, total, 1.0)
+    mean = (hist @ LEVELS) / total
+    var = (hist @ (LEVELS * LEVELS)) / total - mean * mean
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+# Defaults for exposure analysis on a normalized 256-bin histogram. With no
+# smoothing and no prominence threshold "peaks" counts what the original
+# scipy.signal.find_peaks(hist) did; both are opt-in for callers that want
+# only the major modes (e.g. smooth=2, prominence=0.002)
+PEAK_SMOOTH = 0
+PEAK_PROMINENCE = 0
+SHADOW_CLIP = 2
+HIGHLIGHT_CLIP = 253
+RANGE_PERCENTILES = (0.005, 0.995)
+
+
+def smooth_histogram(hist, radius=PEAK_SMOOTH):
+    # Moving average over 2 * radius + 1 bins along the last axis, edges replicated
+    hist = np.asarray(hist, dtype=np.float64)
+    if radius <= 0:
+        return hist
+    pad = [(0, 0)] * (hist.ndim - 1) + [(radius, radius)]
+    padded = np.pad(hist, pad, mode="edge")
+    csum = np.cumsum(padded, axis=-1)
+    csum = np.concatenate([np.zeros(hist.shape[:-1] + (1,)), csum], axis=-1)
+    window = 2 * radius + 1
+    return (csum[..., window:] - csum[..., :-window]) / window
+
+
+def _next_nonzero(values):
+    # For every position, the first non-zero value at or after it (0 if none)
+    size = values.shape[-1]
+    idx = np.where(values != 0, np.arange(size), size)
+    idx = np.minimum.accumulate(idx[..., ::-1], axis=-1)[..., ::-1]
+    padded = np.concatenate([values, np.zeros(values.shape[:-1] + (1,), values.dtype)], axis=-1)
+    return np.take_along_axis(padded, idx, axis=-1)
+
+
+def peak_mask(hist):
+    # Interior local maxima along the last axis; a flat-topped peak counts once
+    slope = np.sign(np.diff(hist, axis=-1))
+    mask = np.zeros(hist.shape, dtype=bool)
+    mask[..., 1:-1] = (slope[..., :-1] > 0) & (_next_nonzero(slope[..., 1:]) < 0)
+    return mask
+
+
+def _prominences(rows, row_ids, peaks):
+    # Height above the higher of the two bases, as in scipy.signal.peak_prominences,
+    # for all peaks of all rows at once: one (peaks x bins) matrix per step
+    h = rows[row_ids]
+    size = rows.shape[-1]
+    pos = np.arange(size)[None, :]
+    at = peaks[:, None]
+    height = h[np.arange(len(peaks)), peaks][:, None]
+    higher = h > height
+    left = np.maximum(np.where(higher & (pos < at), pos, -1).max(axis=1), 0)[:, None]
+    right = np.minimum(np.where(higher & (pos > at), pos, size).min(axis=1), size - 1)[:, None]
+    left_min = np.where((pos >= left) & (pos <= at), h, np.inf).min(axis=1)
+    right_min = np.where((pos >= at) & (pos <= right), h, np.inf).min(axis=1)
+    return height[:, 0] - np.maximum(left_min, right_min)
+
+
+def peak_prominences(hist, peaks):
+    hist = np.asarray(hist, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.intp)
+    if not len(peaks):
+        return np.empty(0)
+    return _prominences(hist[None, :], np.zeros(len(peaks), dtype=np.intp), peaks)
+
+
+def find_histogram_peaks(hist, smooth=PEAK_SMOOTH, prominence=PEAK_PROMINENCE):
+    # Indices match scipy.signal.find_peaks: the middle of a flat-topped peak
+    hist = smooth_histogram(hist, smooth)
+    peaks = np.flatnonzero(peak_mask(hist))
+    if len(peaks):
+        falling = np.flatnonzero(np.diff(hist))
+        right = falling[np.searchsorted(falling, peaks)]
+        peaks = (peaks + right) // 2
+    if prominence > 0 and len(peaks):
+        peaks = peaks[peak_prominences(hist, peaks) >= prominence]
+    return peaks
+
+
+def count_peaks(hist, smooth=PEAK_SMOOTH, prominence=PEAK_PROMINENCE):
+    # Peak count along the last axis
+    hist = smooth_histogram(hist, smooth)
+    mask = peak_mask(hist)
+    if prominence <= 0:
+        return np.count_nonzero(mask, axis=-1)
+    rows = hist.reshape(-1, hist.shape[-1])
+    row_ids, peaks = np.nonzero(mask.reshape(rows.shape))
+    counts = np.zeros(len(rows), dtype=np.int64)
+    if len(peaks):
+        keep = _prominences(rows, row_ids, peaks) >= prominence
+        counts = np.bincount(row_ids[keep], minlength=len(rows))
+    return counts.reshape(hist.shape[:-1])
+
+
+def histogram_shape(hist):
+    """Clipped shadow/highlight percentages and dynamic range (in levels between
+    the 0.5th and 99.5th percentile) of a normalized histogram, along the last axis."""
+    hist = np.asarray(hist, dtype=np.float64)
+    cdf = np.cumsum(hist, axis=-1)
+    low = np.argmax(cdf >= RANGE_PERCENTILES[0] * cdf[..., -1:], axis=-1)
+    high = np.argmax(cdf >= RANGE_PERCENTILES[1] * cdf[..., -1:], axis=-1)
+    return {
+        "shadows_clipped": 100.0 * hist[..., :SHADOW_CLIP + 1].sum(axis=-1),
+        "highlights_clipped": 100.0 * hist[..., HIGHLIGHT_CLIP:].sum(axis=-1),
+        "dynamic_range": high - low,
+    }
+
+
+@instrumented("metrics")
+def compute_metrics(image, scratch=None):
+    """Blur (Laplacian variance), brightness mean/std, normalized histogram
+    and histogram peak count from a single grayscale conversion.
+
+    "gray" and "laplacian" are views of the scratch buffers and are
+    overwritten by the next call."""
+    scratch = scratch or get_scratch()
+    gray_buf, laplacian_buf = scratch.buffers(*image.shape[:2])
+    gray = to_gray(image, gray_buf)
+
+    blur = laplacian_variance(gray, laplacian_buf)
+    counts = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    mean, std = histogram_stats(counts)
+    hist = counts / max(counts.sum(), 1.0)
+
+    return {
+        "blur": blur,
+        "mean": float(mean),
+        "std": float(std),
+        "hist": hist,
+        "peaks": int(count_peaks(hist)),
+        "gray": gray,
+        "laplacian": laplacian_buf,
+    }
+
+
+def compute_metrics_batch(images, scratch=None):
+    # Same as compute_metrics over a stack of equally-sized images (thumbnails).
+    # Only the color conversion and the histogram statistics and peaks are
+    # batched; calcHist and the Laplacian still run per image, as OpenCV has no
+    # stacked form and a single np.bincount over the stack is ~10x slower
+    if not len(images):
+        return []
+    stack = np.ascontiguousarray(images)
+    count, height, width = stack.shape[:3]
+    if stack.ndim == 4:
+        gray = cv2.cvtColor(stack.reshape(count * height, width, 3), cv2.COLOR_BGR2GRAY)
+        gray = gray.reshape(count, height, width)
+    else:
+        gray = stack
+
+    counts = np.stack([cv2.calcHist([g], [0], None, [256], [0, 256]).ravel() for g in gray])
+    means, stds = histogram_stats(counts)
+    hists = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    peaks = count_peaks(hists)
+
+    scratch = scratch or get_scratch()
+    _, laplacian_buf = scratch.buffers(height, width)
+    return [
+        {
+            "blur": laplacian_variance(gray[i], laplacian_buf),
+            "mean": float(means[i]),
+            "std": float(stds[i]),
+            "hist": hists[i],
+            "peaks": int(peaks[i]),
+        }
+        for i in range(count)
+    ]
@@ -0,0 +1,431 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from core.sorter import BLUR_SIDE
+from core.analyzer import analyze_exposure
+from core.face_filter import summarize_faces, get_detector, FACE_SIDE
+from core.face_cluster import get_face_embedding, get_image_hash, backend, PhashIndex, EmbeddingIndex, EMBEDDING_SIDE, HASH_SIDE
+from core.faces import analyze_faces, encode_faces
+from core.metrics import compute_metrics, MetricsScratch
+from core.sharpness import analyze_sharpness, face_focus
+from core.cascade import Stage, FilterCascade
+from utils.image_loader import load_image, analysis_side, resize_to_side, scale_to_side
+from utils.image_store import open_image
+from utils import instrumentation
+from utils.instrumentation import instrumented
+
+# Bump when any analyzer's output changes so cached results are recomputed
+ANALYZER_VERSION = "8"
+
+
+def _metrics(img, context):
+    # Blur, exposure and sharpness share one fused grayscale/Laplacian/histogram
+    # pass, measured at BLUR_SIDE so the blur score matches get_blur_score.
+    # Its gray and Laplacian live in the thread's scratch buffers unless the
+    # context brings its own, which it must if other images are analyzed
+    # between two stages of this one
+    if "metrics" not in context:
+        context["metrics"] = compute_metrics(scale_to_side(img, BLUR_SIDE), context.get("scratch"))
+    return context["metrics"]
+
+
+def _plain(func):
+    return lambda img, context: func(img)
+
+
+@instrumented("face_attributes")
+def _face_attributes(img, context):
+    # Summary for scoring; the detected faces stay in context for face_focus
+    context["faces"] = get_detector().detect_faces(img)
+    return summarize_faces(context["faces"])
+
+
+def _analyze_faces(img, context):
+    # Detection only: encoding is by far the costlier step and only the
+    # identity check needs it, so it is left to the "encodings" stage
+    context["faces"] = analyze_faces(img, embeddings=False)
+    return context["faces"]
+
+
+def _encodings(img, context):
+    # Encodes the boxes of an earlier "faces" result rather than detecting again
+    if "faces" not in context:
+        context["faces"] = analyze_faces(img, embeddings=False)
+    return encode_faces(img, context["faces"])
+
+
+def _face_focus(img, context):
+    # Reuses the faces an earlier stage of this image found, detecting them
+    # only when face_focus is asked for on its own
+    if "faces" not in context:
+        context["faces"] = get_detector().detect_faces(img)
+    return face_focus(img, context["faces"], _metrics(img, context))
+
+
+# Stage functions take (image, context); context holds intermediates shared
+# between stages of the same image
+STAGES = {
+    "blur": (lambda img, context: _metrics(img, context)["blur"], BLUR_SIDE),
+    "exposure": (lambda img, context: analyze_exposure(img, _metrics(img, context)), BLUR_SIDE),
+    # Tiled focus map from the same Laplacian; cheap enough for the sort pass
+    "sharpness": (lambda img, context: analyze_sharpness(img, _metrics(img, context)), BLUR_SIDE),
+    "face": (_face_attributes, FACE_SIDE),
+    # A packed int, which is what PhashIndex works with and the cache stores
+    "hash": (_plain(get_image_hash), HASH_SIDE),
+    "embedding": (_plain(get_face_embedding), EMBEDDING_SIDE),
+    # Single detection pass producing attributes and boxes for every face
+    "faces": (_analyze_faces, FACE_SIDE),
+    # One embedding per face above, from face_recognition's encoder
+    "encodings": (_encodings, EMBEDDING_SIDE),
+    # Face and eye-region sharpness from the faces above and the shared Laplacian
+    "face_focus": (_face_focus, FACE_SIDE),
+}
+SORT_STAGES = ("blur", "sharpness")
+SCORE_STAGES = ("blur", "sharpness", "face", "face_focus", "exposure")
+FILTER_STAGES = ("faces", "hash", "face_focus")
+# Resolution an ImageStore shared by the sort, filter and scoring passes
+# decodes at; the few stages that need more (encodings) read the file instead
+STORE_SIDE = analysis_side(*(STAGES[name][1] for name in SORT_STAGES + SCORE_STAGES + FILTER_STAGES))
+
+# Backends each stage loads on first use; see warm_up()
+STAGE_BACKENDS = {
+    "face": ("mediapipe",),
+    "faces": ("mediapipe",),
+    "encodings": ("mediapipe", "face_recognition"),
+    "embedding": ("face_recognition",),
+    "face_focus": ("mediapipe",),
+}
+
+
+def warm_up(stages=FILTER_STAGES, load_models=False):
+    """Imports the libraries `stages` need now instead of on the first image;
+    worker processes forked afterwards inherit them and skip the import too.
+    face_recognition loads dlib's models as part of its import. load_models
+    also builds this thread's FaceMesh graph, which is only worth it when
+    analysis runs in this process (workers=1) and must not happen before
+    forking workers, as the graph's threads don't survive a fork."""
+    for name in stages:
+        for module in STAGE_BACKENDS.get(name, ()):
+            backend(module)
+            if module == "mediapipe" and load_models:
+                get_detector()
+
+
+def _decode(path, stages, store, result):
+    side = analysis_side(*(STAGES[name][1] for name in stages))
+    if store is None or (store.max_side and side > store.max_side):
+        return load_image(path, side)
+    try:
+        handle = store.load(path)
+        if handle is None:
+            return None
+        image = open_image(handle)
+    except (OSError, ValueError):
+        # Store full, or the file was evicted by another process in between
+        return load_image(path, side)
+    result["handle"] = handle
+    return image
+
+
+def analyze_path(path, stages=SORT_STAGES, store=None):
+    # Runs in a worker process: only the path crosses the process boundary,
+    # the image is decoded here at the largest resolution the stages need, or
+    # mapped from `store` (an ImageStore) if an earlier pass already decoded it
+    result = {"filename": os.path.basename(path), "path": path, "error": None, "errors": {}}
+    if not stages:
+        return result
+    try:
+        img = _decode(path, stages, store, result)
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+    if img is None:
+        result["error"] = "could not decode image"
+        return result
+    context = {}
+    with instrumentation.trace("analyze", path):
+        for name in stages:
+            func = STAGES[name][0]
+            try:
+                result[name] = func(img, context)
+            except Exception as e:
+                result[name] = None
+                result["errors"][name] = str(e)
+    return result
+
+
+def _analyze_in_worker(path, stages, store):
+    # Worker-process entry point: stage timings recorded here travel back
+    # with the result and are merged into the parent's registry by _finish
+    result = analyze_path(path, stages, store)
+    metrics = instrumentation.collect()
+    if metrics:
+        result["metrics"] = metrics
+    return result
+
+
+def _plan(paths, stages, cache):
+    for path in paths:
+        if cache is None:
+            yield path, None, {}, stages
+            continue
+        try:
+            key = cache.file_key(path)
+        except OSError:
+            yield path, None, {}, stages
+            continue
+        cached = cache.get(key, stages)
+        instrumentation.increment("cache_hits", len(cached))
+        instrumentation.increment("cache_misses", len(stages) - len(cached))
+        yield path, key, cached, tuple(name for name in stages if name not in cached)
+
+
+def _finish(result, key, cached, cache):
+    instrumentation.merge(result.pop("metrics", None))
+    if cache is not None and key is not None and result["error"] is None:
+        fresh = {
+            name: result[name] for name in STAGES
+            if name in result and name not in result["errors"] and name not in cached
+        }
+        if fresh:
+            cache.put(key, fresh)
+    result.update(cached)
+    return result
+
+
+def _from_cache(path, cached, store):
+    result = {"filename": os.path.basename(path), "path": path, "error": None, "errors": {}}
+    handle = store.lookup(path) if store is not None else None
+    if handle is not None:
+        result["handle"] = handle
+    result.update(cached)
+    return result
+
+
+def run_pipeline(paths, stages=SORT_STAGES, workers=None, cache=None, store=None):
+    """Analyze every path and yield result dicts in completion order.
+
+    Stages already in `cache` (an AnalysisCache) are not recomputed. At most a
+    few tasks per worker are in flight, so stopping early (e.g. once enough
+    photos are approved) wastes little work. With a `store` (an ImageStore at
+    STORE_SIDE) images are decoded once across passes and results carry a
+    "handle" to the mapped pixels; call store.reserve(len(paths)) first so
+    the store keeps every image for the next pass."""
+    workers = workers or os.cpu_count() or 1
+    tasks = _plan(paths, stages, cache)
+    if workers == 1:
+        for path, key, cached, missing in tasks:
+            if not missing:
+                yield _from_cache(path, cached, store)
+            else:
+                yield _finish(analyze_path(path, missing, store), key, cached, cache)
+        return
+
+    pending = {}
+    pool = None
+    try:
+        while True:
+            # Top up the in-flight window; cache hits never reach the pool
+            while len(pending) < workers * 2:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                path, key, cached, missing = task
+                if not missing:
+                    yield _from_cache(path, cached, store)
+                    continue
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=instrumentation.worker_init)
+                pending[pool.submit(_analyze_in_worker, path, missing, store)] = (key, cached)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, cached = pending.pop(future)
+                result = future.result()
+                if store is not None and "handle" in result:
+                    # The worker's store copy can't keep count across tasks
+                    store.track(result["handle"])
+                yield _finish(result, key, cached, cache)
+    finally:
+        for future in pending:
+            future.cancel()
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def in_order(results, paths):
+    # Re-sequence completion-ordered results for order-dependent reduce steps
+    position = {path: i for i, path in enumerate(paths)}
+    buffered = {}
+    next_index = 0
+    for result in results:
+        buffered[position[result["path"]]] = result
+        while next_index in buffered:
+            yield buffered.pop(next_index)
+            next_index += 1
+
+
+class LazyResult(dict):
+    """A pipeline result that computes missing stages in-process on first
+    item[stage] access, so stages a cascade never reaches are never run.
+    The image is mapped from the result's "handle" when the pipeline used an
+    ImageStore, or decoded at STORE_SIDE; a stage needing more than that
+    (encodings) decodes the file once more at its own side."""
+
+    def __init__(self, result):
+        super().__init__(result)
+        self._image = None
+        self._side = STORE_SIDE
+        # Stages are computed one access at a time, interleaved with other images
+        self._context = {"scratch": MetricsScratch()}
+        if result.get("faces") is not None:
+            # Precomputed detections, which "encodings" and "face_focus" build on
+            self._context["faces"] = result["faces"]
+
+    def _load(self, side):
+        handle = self.get("handle")
+        if handle and side <= STORE_SIDE:
+            try:
+                return open_image(handle)
+            except (OSError, ValueError):
+                # Evicted from the store since the pass that produced the handle
+                pass
+        try:
+            return load_image(self["path"], side)
+        except Exception as e:
+            self["error"] = str(e)
+            return None
+
+    def __missing__(self, name):
+        if name not in STAGES or self["error"]:
+            raise KeyError(name)
+        func, side = STAGES[name]
+        if self._image is None or side > self._side:
+            self._side = max(side, STORE_SIDE)
+            self._image = self._load(self._side)
+            if self._image is None:
+                self["error"] = "could not decode image"
+                raise KeyError(name)
+        try:
+            value = func(resize_to_side(self._image, side), self._context)
+        except Exception as e:
+            value = None
+            self["errors"][name] = str(e)
+        self[name] = value
+        return value
+
+
+class CullReducer:
+    """Sequential part of culling: dedup and "already seen this person"
+    decisions depend on what was accepted before, so they run in order.
+
+    The filters run as a FilterCascade whose canonical order is the original
+    face -> duplicate -> identity order; cheap, frequently-rejecting stages
+    move to the front without changing any decision.
+
+    With `bursts` (path -> burst id, see core.burst.burst_ids) near-duplicates
+    are only looked for inside a frame's own burst; frames outside any burst
+    share one index. Fed by core.burst.best_first, a burst's best frame comes
+    first and the rest are rejected as duplicates of it."""
+
+    def __init__(self, eyes=True, smile=True, duplicates=True, hash_threshold=5, face_threshold=0.6, adaptive=True, bursts=None):
+        self.eyes = eyes
+        self.smile = smile
+        self.duplicates = duplicates
+        self.hash_threshold = hash_threshold
+        self.face_threshold = face_threshold
+        self.bursts = bursts or {}
+        self.hash_index = PhashIndex()
+        self.burst_indexes = {}
+        self.face_index = EmbeddingIndex()
+        self._new_faces = []
+        # What the last reduce() added to the indexes; journaled so a resumed
+        # run can restore() the same state without re-analyzing
+        self.committed = {}
+
+        stages = []
+        if eyes or smile:
+            stages.append(Stage("face", self._check_face))
+        if duplicates:
+            stages.append(Stage("duplicate", self._check_duplicate, self._commit_duplicate))
+        stages.append(Stage("identity", self._check_identity, self._commit_identity))
+        self.cascade = FilterCascade(stages, adaptive=adaptive)
+
+    def _check_face(self, item):
+        faces = item["faces"]
+        if "faces" in item["errors"]:
+            # As in the original loop, an image whose analysis raised is rejected
+            return True, ["face analysis failed"]
+        attributes = summarize_faces(faces)
+        reason = []
+        if self.eyes and not attributes.get("eyes_open"):
+            reason.append("eyes closed")
+        if self.smile and not attributes.get("smiling"):
+            reason.append("not smiling")
+        return bool(reason), reason
+
+    def _hash_index_for(self, item):
+        burst = self.bursts.get(item["path"])
+        if burst is None:
+            return self.hash_index
+        if burst not in self.burst_indexes:
+            self.burst_indexes[burst] = PhashIndex()
+        return self.burst_indexes[burst]
+
+    def _check_duplicate(self, item):
+        img_hash = item["hash"]
+        if "hash" in item["errors"]:
+            return True, ["hash failed"]
+        if img_hash is not None and self._hash_index_for(item).contains(img_hash, self.hash_threshold):
+            return True, ["duplicate"]
+        return False, []
+
+    def _commit_duplicate(self, item):
+        if item["hash"] is not None:
+            self._hash_index_for(item).insert(item["hash"], item["filename"])
+            self.committed["hash"] = item["hash"]
+
+    def _check_identity(self, item):
+        # Faces are only encoded here, once the cheaper checks let the image through
+        encodings = item["encodings"]
+        self._new_faces = []
+        if "encodings" in item["errors"]:
+            return True, ["embedding error"]
+        embeddings = [e for e in encodings or [] if e is not None]
+        if not embeddings:
+            return False, []
+        # Only reject when every face in the frame has been seen before
+        _, distances = self.face_index.nearest_many(embeddings)
+        self._new_faces = [e for e, d in zip(embeddings, distances) if d >= self.face_threshold]
+        if not self._new_faces:
+            return True, ["similar face"]
+        return False, []
+
+    def _commit_identity(self, item):
+        if self._new_faces:
+            self.face_index.add_many(self._new_faces)
+            self.committed["faces"] = self._new_faces
+
+    def restore(self, path, filename, committed):
+        # Replays a journaled reduce() of an image into the indexes
+        if committed.get("hash") is not None:
+            self._hash_index_for({"path": path}).insert(committed["hash"], filename)
+        if committed.get("faces"):
+            self.face_index.add_many(committed["faces"])
+
+    def reduce(self, result):
+        self.committed = {}
+        item = result if isinstance(result, LazyResult) else LazyResult(result)
+        if item["error"]:
+            return False, [item["error"]]
+        try:
+            return self.cascade.run(item)
+        except KeyError:
+            # A lazily computed stage found the image undecodable
+            if not item["error"]:
+                raise
+            result["error"] = item["error"]
+            return False, [item["error"]]
+
+    def report(self):
+        return self.cascade.report()
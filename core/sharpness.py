@@ -0,0 +1,148 @@
+import cv2
+import numpy as np
+from core.metrics import compute_metrics
+from core.sorter import BLUR_SIDE
+from utils.image_loader import scale_to_side
+from utils.instrumentation import instrumented
+
+# Focus map cell size in pixels of the BLUR_SIDE image (32x22 cells for 3:2)
+FOCUS_TILE = 32
+# Subject sharpness: mean variance of the sharpest tenth of the tiles, so a
+# sharp subject against bokeh isn't averaged away like in the global variance
+FOCUS_TOP_FRACTION = 0.1
+# Eyes lie in this band of a face box, as fractions of its height from the top
+EYE_BAND = (0.2, 0.5)
+
+
+def _variance(sums, sqsums, counts):
+    counts = np.maximum(counts, 1)
+    mean = sums / counts
+    return np.maximum(sqsums / counts - mean * mean, 0.0)
+
+
+class FocusMap:
+    """Integral images of a Laplacian and of its square (cv2.integral2), so
+    the Laplacian variance of any rectangle, and of every tile at once, costs
+    four lookups instead of a pass over its pixels."""
+
+    def __init__(self, laplacian):
+        self.height, self.width = laplacian.shape[:2]
+        self.sum, self.sqsum = cv2.integral2(laplacian, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    def _boxes(self, table, ys, xs):
+        # Sums over the grid of rectangles between consecutive ys and xs edges
+        corners = table[np.ix_(ys, xs)]
+        return corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+
+    def tiles(self, tile=FOCUS_TILE):
+        # Per-tile (sum, sum of squares) and pixel counts; edge tiles may be smaller
+        ys = np.append(np.arange(0, self.height, tile), self.height)
+        xs = np.append(np.arange(0, self.width, tile), self.width)
+        moments = np.stack([self._boxes(self.sum, ys, xs), self._boxes(self.sqsum, ys, xs)], axis=-1)
+        return moments, np.outer(np.diff(ys), np.diff(xs))
+
+    def region(self, top, right, bottom, left):
+        top, bottom = np.clip((top, bottom), 0, self.height).astype(int)
+        left, right = np.clip((left, right), 0, self.width).astype(int)
+        if bottom <= top or right <= left:
+            return None
+        ys, xs = np.array([top, bottom]), np.array([left, right])
+        sums = self._boxes(self.sum, ys, xs)[0, 0]
+        sqsums = self._boxes(self.sqsum, ys, xs)[0, 0]
+        return float(_variance(sums, sqsums, (bottom - top) * (right - left)))
+
+
+def _scaled_box(box, frame, shape):
+    # A face box (top, right, bottom, left) from an image of size `frame` in `shape` pixels
+    top, right, bottom, left = box
+    sy, sx = shape[0] / frame[0], shape[1] / frame[1]
+    return top * sy, right * sx, bottom * sy, left * sx
+
+
+def _eye_band(top, right, bottom, left):
+    height = bottom - top
+    return top + height * EYE_BAND[0], right, top + height * EYE_BAND[1], left
+
+
+def subject_focus(focus_map):
+    values = np.sort(np.asarray(focus_map, dtype=np.float64).ravel())[::-1]
+    if not len(values):
+        return 0.0
+    return float(values[:max(1, int(len(values) * FOCUS_TOP_FRACTION))].mean())
+
+
+def _face_regions(focus, faces):
+    # Sharpest face and eye-band variance over `faces` (each with a "box"
+    # and the "frame" it refers to); None where there is no face
+    shape = (focus.height, focus.width)
+    boxes = [_scaled_box(face["box"], face["frame"], shape) for face in faces or [] if face.get("frame")]
+    face_values = [v for v in (focus.region(*box) for box in boxes) if v is not None]
+    eye_values = [v for v in (focus.region(*_eye_band(*box)) for box in boxes) if v is not None]
+    return {"face": max(face_values, default=None), "eyes": max(eye_values, default=None)}
+
+
+@instrumented("sharpness")
+def analyze_sharpness(image, metrics=None, faces=None):
+    """Regional sharpness of an image analyzed at BLUR_SIDE.
+
+    Pass `metrics` from compute_metrics of the same image to reuse its
+    Laplacian. Returns the whole-frame variance ("global", the old blur
+    score), the sharpest tile ("max_tile"), the subject sharpness ("focus")
+    and the focus map (Laplacian variance per FOCUS_TILE cell). With `faces`,
+    "face" and "eyes" are the sharpest face and eye regions, as face_focus()
+    measures them."""
+    if metrics is None:
+        metrics = compute_metrics(scale_to_side(image, BLUR_SIDE))
+    focus = FocusMap(metrics["laplacian"])
+    moments, counts = focus.tiles()
+    focus_map = _variance(moments[..., 0], moments[..., 1], counts).astype(np.float32)
+    result = {
+        "global": metrics["blur"],
+        "max_tile": float(focus_map.max()),
+        "focus": subject_focus(focus_map),
+        "map": focus_map,
+        "shape": [focus.height, focus.width],
+        "face": None,
+        "eyes": None,
+    }
+    if faces:
+        result.update(_face_regions(focus, faces))
+    return result
+
+
+@instrumented("face_focus")
+def face_focus(image, faces, metrics=None):
+    """Sharpness of the sharpest face and of its eye band, as Laplacian
+    variance of exactly those regions at BLUR_SIDE. `faces` are detections
+    of the same image (FaceAttributeDetector.detect_faces or analyze_faces).
+    Returns {"face": ..., "eyes": ...}, both None without faces."""
+    if not faces:
+        return {"face": None, "eyes": None}
+    if metrics is None:
+        metrics = compute_metrics(scale_to_side(image, BLUR_SIDE))
+    return _face_regions(FocusMap(metrics["laplacian"]), faces)
+
+
+def focus_overlay(image, focus_map, alpha=0.35):
+    # The focus map as a heat map over `image` (BGR, any size), for previews;
+    # each cell is scaled to the frame's sharpest one
+    focus_map = np.asarray(focus_map, dtype=np.float32)
+    peak = max(float(focus_map.max()), 1e-6)
+    levels = np.sqrt(focus_map / peak) * 255
+    heat = cv2.applyColorMap(levels.astype(np.uint8), cv2.COLORMAP_JET)
+    heat = cv2.resize(heat, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+    return cv2.addWeighted(image, 1.0 - alpha, heat, alpha, 0)
+
+
+def sort_score(result):
+    # What culling orders frames by: the eyes, else the face, when faces were
+    # found and measured ("face_focus"), subject sharpness when only the
+    # sharpness stage ran, the whole-frame blur score otherwise
+    regions = result.get("face_focus") or {}
+    for region in ("eyes", "face"):
+        if regions.get(region) is not None:
+            return regions[region]
+    sharpness = result.get("sharpness")
+    if sharpness:
+        return sharpness["focus"]
+    return result.get("blur")
@@ -1,12 +1,23 @@
-import cv2
+from core.metrics import to_gray, laplacian_variance
+from utils.image_loader import scale_to_side
+from utils.instrumentation import instrumented
 
+# Blur is always measured at this long edge, smaller images enlarged and
+# larger ones reduced, so Laplacian variance stays comparable no matter what
+# size the file or the caller's decode was
+BLUR_SIDE = 1024
+
+@instrumented("blur")
 def get_blur_score(image):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    return cv2.Laplacian(gray, cv2.CV_64F).var()
+    image = scale_to_side(image, BLUR_SIDE)
+    return laplacian_variance(to_gray(image))
 
 def sort_images_by_blur(images):
+    # Accepts a dict or any iterable of (filename, image) pairs
+    if isinstance(images, dict):
+        images = images.items()
     results = {}
-    for filename, img in images.items():
+    for filename, img in images:
         score = get_blur_score(img)
         results[filename] = score
     return results
@@ -1,30 +1,31 @@
 import sys
 import os
-import shutil
-import numpy as np
+import time
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QFileDialog, QCheckBox, QTextEdit, QProgressBar, QListWidget, QListWidgetItem, QMessageBox, QSplitter,
-    QGridLayout, QFrame, QScrollArea, QComboBox, QSpinBox, QGroupBox
+    QFileDialog, QCheckBox, QTextEdit, QProgressBar, QMessageBox, QFrame, QComboBox, QSpinBox, QGroupBox
 )
-from PyQt5.QtGui import QPixmap, QImage, QIcon
-from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal, QTimer
-from PIL import Image
-import json
+from PyQt5.QtGui import QPixmap, QImage
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 import os.path
-from functools import lru_cache
-from core.sorter import sort_images_by_blur
-from utils.image_loader import load_images_from_folder
-from core.face_filter import detect_face_attributes
-from core.face_cluster import get_face_embedding, get_image_hash, are_images_duplicates
-from core.analyzer import analyze_exposure, calculate_image_score
-import qtmodern.styles
-import qtmodern.windows
+from utils.image_loader import scan_folder
+from utils.image_store import ImageStore
+from utils.thumbnails import ThumbnailService, THUMBNAIL_SIZES
+from ui.thumbnail_grid import ThumbnailModel, ScoredGridModel, ThumbnailDelegate, thumbnail_view, PathRole
+from ui.culling_engine import CullingEngine, EMIT_INTERVAL
+from ui.stats_panel import StatsPanel
+from utils.exporter import Exporter, EXPORT_MODES, MANIFEST_NAME
+from core.pipeline import run_pipeline, SCORE_STAGES, ANALYZER_VERSION, STORE_SIDE
+from utils.analysis_cache import AnalysisCache
+from core.analyzer import calculate_image_score
+from core.sharpness import focus_overlay
 
 class ProcessingThread(QThread):
     progress = pyqtSignal(int)
     finished = pyqtSignal()
     log = pyqtSignal(str)
+    # Batches of filename -> scores; the GUI thread owns image_scores
+    scored = pyqtSignal(dict)
     
     def __init__(self, app):
         super().__init__()
@@ -34,12 +35,27 @@ class ProcessingThread(QThread):
         self.app.process_images()
 
 
+def bgr_to_pixmap(img):
+    # QImage reads the BGR rows in place; the pixmap is the only copy
+    return QPixmap.fromImage(QImage(img.data, img.shape[1], img.shape[0], img.strides[0], QImage.Format_BGR888))
+
+
 class AilbumsApp(QWidget):
+    # (path, size, image) from the thumbnail pool, delivered on the GUI thread
+    thumbnail_ready = pyqtSignal(str, str, object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Ailbums Culling App")
         self.cache_dir = os.path.join(os.path.expanduser("~"), ".ailbums_cache")
         os.makedirs(self.cache_dir, exist_ok=True)
+        # Shared with the CLI; keyed by file content so it survives folder changes
+        self.analysis_cache = AnalysisCache(os.path.join(self.cache_dir, "analysis.sqlite3"), version=ANALYZER_VERSION)
+        # Decoded pixels live in memory-mapped files shared with the analysis
+        # workers; widgets keep paths and map an image only while showing it
+        self.image_store = ImageStore(max_side=STORE_SIDE)
+        self.thumbnails = ThumbnailService(os.path.join(self.cache_dir, "thumbnails"))
+        self.thumbnail_ready.connect(self.on_thumbnail_ready)
         self.setGeometry(200, 100, 1200, 750)
         self.setStyleSheet("""
             QWidget {
@@ -61,13 +77,15 @@ class AilbumsApp(QWidget):
             }
         """)
         self.folder_path = ""
-        self.images = {}
-        self.known_embeddings = []
-        self.seen_hashes = []
+        self.image_paths = {}
+        self.face_index = None
+        self.hash_index = None
         self.exported = 0
         self.image_status = {}
         self.image_scores = {}
         self.thumbnail_cache = {}
+        self.placeholder = QPixmap(THUMBNAIL_SIZES["grid"], THUMBNAIL_SIZES["grid"])
+        self.placeholder.fill(Qt.lightGray)
         self.filter_settings = {
             "min_score": 5,
             "sort_by": "score",
@@ -87,6 +105,9 @@ class AilbumsApp(QWidget):
         title = QLabel("Ailbums")
         title.setStyleSheet("font-size: 24px; font-weight: bold; color: #1976D2;")
         header_layout.addWidget(title)
+
+        self.folder_label = QLabel("No folder selected")
+        header_layout.addWidget(self.folder_label)
         
         self.folder_btn = QPushButton("Select Folder")
         self.folder_btn.clicked.connect(self.select_folder)
@@ -98,7 +119,7 @@ class AilbumsApp(QWidget):
         filter_layout = QHBoxLayout()
         
         self.sort_combo = QComboBox()
-        self.sort_combo.addItems(["Score", "Blur", "Exposure"])
+        self.sort_combo.addItems(["Score", "Blur", "Focus", "Exposure"])
         self.sort_combo.currentTextChanged.connect(self.apply_filters)
         
         self.min_score = QSpinBox()
@@ -110,19 +131,20 @@ class AilbumsApp(QWidget):
         filter_layout.addWidget(self.sort_combo)
         filter_layout.addWidget(QLabel("Min score:"))
         filter_layout.addWidget(self.min_score)
+        self.focus_cb = QCheckBox("Focus map in preview")
+        filter_layout.addWidget(self.focus_cb)
         filter_box.setLayout(filter_layout)
         layout.addWidget(filter_box)
 
-        # Create grid for thumbnails
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setStyleSheet("QScrollArea { border: none; }")
-        
-        content = QWidget()
-        self.grid = QGridLayout(content)
-        scroll.setWidget(content)
-        
-        layout.addWidget(scroll)
+        # One model for the folder; the scored grid is a filtered, sorted view of it
+        self.model = ThumbnailModel(self.get_thumbnail, self)
+        self.scored = ScoredGridModel(self.model, self)
+        self.grid = thumbnail_view(self.scored, ThumbnailDelegate(THUMBNAIL_SIZES["grid"], show_scores=True, parent=self))
+        self.grid.doubleClicked.connect(self.preview_full_image)
+        layout.addWidget(self.grid)
+        # Start from the widgets' values, so scores arriving before the first
+        # filter change are already held to the same minimum
+        self.apply_filters()
 
         options = QHBoxLayout()
         self.eyes_cb = QCheckBox("Filter closed eyes")
@@ -136,8 +158,17 @@ class AilbumsApp(QWidget):
         options.addWidget(self.dup_cb)
 
         self.processing_thread = ProcessingThread(self)
+        self.processing_thread.log.connect(self.log_line)
+        self.processing_thread.scored.connect(self.on_scored)
+        self.culling_engine = None
         self.start_btn = QPushButton("Start Culling")
         self.start_btn.clicked.connect(self.run_culling)
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_culling)
 
         self.progress = QProgressBar()
 
@@ -155,18 +186,31 @@ class AilbumsApp(QWidget):
         self.export_threshold.setRange(0, 10)
         self.export_threshold.setValue(7)
         
+        self.export_mode = QComboBox()
+        self.export_mode.addItems(EXPORT_MODES)
+
         export_btn = QPushButton("Export Selected")
         export_btn.clicked.connect(self.export_selected)
         
         export_layout.addWidget(QLabel("Quality threshold:"))
         export_layout.addWidget(self.export_threshold)
+        export_layout.addWidget(QLabel("Mode:"))
+        export_layout.addWidget(self.export_mode)
         export_layout.addWidget(export_btn)
         export_box.setLayout(export_layout)
         layout.addWidget(export_box)
-        layout.addWidget(self.start_btn)
+        run_controls = QHBoxLayout()
+        run_controls.addWidget(self.start_btn)
+        run_controls.addWidget(self.pause_btn)
+        run_controls.addWidget(self.cancel_btn)
+        layout.addLayout(run_controls)
         layout.addWidget(self.progress)
         layout.addWidget(self.log_box)
+        self.stats_panel = StatsPanel(self)
+        layout.addWidget(self.stats_panel)
         layout.addWidget(QLabel("Approved & Rejected Thumbnails:"))
+        self.thumb_list = thumbnail_view(self.model, ThumbnailDelegate(THUMBNAIL_SIZES["grid"], parent=self))
+        self.thumb_list.doubleClicked.connect(self.preview_full_image)
         layout.addWidget(self.thumb_list)
 
         self.setLayout(layout)
@@ -174,101 +218,48 @@ class AilbumsApp(QWidget):
     def select_folder(self):
         path = QFileDialog.getExistingDirectory(self, "Select folder")
         if path:
-            self.clear_cache()
             self.folder_path = path
             self.folder_label.setText(f"📁 {path}")
             self.log_box.append(f"Loaded folder: {path}")
             self.load_images()
 
-    @lru_cache(maxsize=100)
-    def get_cached_thumbnail(self, filename):
-        cache_path = os.path.join(self.cache_dir, f"{filename}.json")
-        if os.path.exists(cache_path):
-            with open(cache_path, 'r') as f:
-                return json.load(f)
-        return None
-
-    def save_to_cache(self, filename, data):
-        cache_path = os.path.join(self.cache_dir, f"{filename}.json")
-        with open(cache_path, 'w') as f:
-            json.dump(data, f)
-
     def clear_cache(self):
-        for file in os.listdir(self.cache_dir):
-            os.remove(os.path.join(self.cache_dir, file))
+        self.analysis_cache.clear()
 
     def apply_filters(self):
+        # Re-filters and re-sorts the grid model; no widgets are created or destroyed
         sort_by = self.sort_combo.currentText().lower()
         min_score = self.min_score.value()
-        
-        filtered_images = {}
-        for filename, scores in self.image_scores.items():
-            if scores["total"] >= min_score:
-                filtered_images[filename] = scores
-        
-        sorted_images = sorted(
-            filtered_images.items(),
-            key=lambda x: x[1][sort_by] if sort_by != "score" else x[1]["total"],
-            reverse=True
-        )
-        
-        self.update_grid(sorted_images)
+        self.model.set_scores(self.image_scores)
+        self.scored.set_filter(min_score, sort_by)
 
-    def update_grid(self, sorted_images):
-        # Clear existing grid
-        for i in reversed(range(self.grid.count())): 
-            self.grid.itemAt(i).widget().setParent(None)
-        
-        # Add filtered and sorted images
-        row = 0
-        col = 0
-        for filename, scores in sorted_images:
-            thumb_widget = self.create_thumbnail_widget(filename, scores)
-            self.grid.addWidget(thumb_widget, row, col)
-            col += 1
-            if col > 3:
-                col = 0
-                row += 1
-
-    def create_thumbnail_widget(self, filename, scores):
-        widget = QFrame()
-        widget.setStyleSheet("background: white; border-radius: 8px; padding: 8px;")
-        layout = QVBoxLayout(widget)
-        
-        # Image thumbnail
-        img_label = QLabel()
-        pixmap = self.get_thumbnail(filename)
-        img_label.setPixmap(pixmap)
-        layout.addWidget(img_label)
-        
-        # Stats
-        stats = QLabel(f"""
-            Score: {scores['total']:.1f}
-            Blur: {scores['blur']:.0f}
-            Eyes: {'✓' if scores['face']['eyes_open'] else '✗'}
-            Smile: {'✓' if scores['face']['smiling'] else '✗'}
-            Exposure: {scores['exposure']['quality']}
-        """)
-        stats.setStyleSheet("font-size: 10px;")
-        layout.addWidget(stats)
-        
-        return widget
     def process_images(self):
-        for i, (filename, img) in enumerate(self.images.items()):
+        # Runs on processing_thread: results go back to the GUI thread in
+        # batches through the scored signal, never into shared dicts
+        paths = list(self.image_paths.values())
+        batch = {}
+        last_emit = time.monotonic()
+        results = run_pipeline(paths, SCORE_STAGES, cache=self.analysis_cache, store=self.image_store)
+        for i, result in enumerate(results):
+            if self.processing_thread.isInterruptionRequested():
+                break
+            filename = result["filename"]
             try:
-                # Calculate all scores
-                blur_score = sort_images_by_blur({filename: img})[filename]
-                face_attrs = detect_face_attributes(img)
-                exposure_data = analyze_exposure(img)
-                
+                if result["error"]:
+                    raise ValueError(result["error"])
+                for stage, error in result["errors"].items():
+                    raise ValueError(f"{stage}: {error}")
+
                 # Calculate final score
-                final_score = calculate_image_score(blur_score, face_attrs, exposure_data)
+                final_score = calculate_image_score(result["blur"], result["face"], result["exposure"])
                 
-                self.image_scores[filename] = {
+                batch[filename] = {
                     "total": final_score,
-                    "blur": blur_score,
-                    "face": face_attrs,
-                    "exposure": exposure_data
+                    "blur": result["blur"],
+                    "sharpness": result["sharpness"],
+                    "face_focus": result["face_focus"],
+                    "face": result["face"],
+                    "exposure": result["exposure"]
                 }
                 
                 self.processing_thread.progress.emit(i + 1)
@@ -276,144 +267,188 @@ class AilbumsApp(QWidget):
             except Exception as e:
                 self.processing_thread.log.emit(f"Error processing {filename}: {str(e)}")
 
-    def load_images(self):
-        self.thumb_list.clear()
-        self.images = load_images_from_folder(self.folder_path)
-        for filename, img in self.images.items():
-            self.add_thumbnail(img, filename, "Pending")
-
-    def run_culling(self):
-        self.processing_thread.start()
-        rejected_folder = os.path.join(self.folder_path, "Rejected")
-        os.makedirs(approved_folder, exist_ok=True)
-        os.makedirs(rejected_folder, exist_ok=True)
-
-        sorted_results = sort_images_by_blur(self.images)
-        sorted_items = sorted(sorted_results.items(), key=lambda x: x[1], reverse=True)
-
-        self.progress.setMaximum(min(50, len(sorted_items)))
-        self.exported = 0
-        self.known_embeddings = []
-        self.seen_hashes = []
-
-        for i, (filename, _) in enumerate(sorted_items):
-            if self.exported >= 50:
-                break
-
-            src_path = os.path.join(self.folder_path, filename)
-            img = self.images[filename]
-            reject = False
-            reason = []
-
-            try:
-                attributes = None
-                if self.smile_cb.isChecked() or self.eyes_cb.isChecked():
-                    try:
-                        attributes = detect_face_attributes(img)
-                    except Exception:
-                        reason.append("no face detected")
-
-                if attributes:
-                    if self.eyes_cb.isChecked() and not attributes.get("eyes_open"):
-                        reason.append("eyes closed")
-                        reject = True
-                    if self.smile_cb.isChecked() and not attributes.get("smiling"):
-                        reason.append("not smiling")
-                        reject = True
-
-                if not reject and self.dup_cb.isChecked():
-                    img_hash = get_image_hash(img)
-                    if any(are_images_duplicates(img_hash, h) for h in self.seen_hashes):
-                        reason.append("duplicate")
-                        reject = True
-                    else:
-                        self.seen_hashes.append(img_hash)
-
-                if not reject:
-                    try:
-                        embedding = get_face_embedding(img)
-                        if embedding is not None:
-                            if any(np.linalg.norm(embedding - e) < 0.6 for e in self.known_embeddings):
-                                reason.append("similar face")
-                                reject = True
-                            else:
-                                self.known_embeddings.append(embedding)
-                    except Exception:
-                        reason.append("embedding error")
-
-                dest = rejected_folder if reject else approved_folder
-                shutil.copyfile(src_path, os.path.join(dest, filename))
-
-                if not reject:
-                    self.exported += 1
-                    self.log_box.append(f"✅ {filename}")
-                    self.image_status[filename] = "Approved"
-                else:
-                    self.log_box.append(f"❌ {filename}: {'; '.join(reason)}")
-                    self.image_status[filename] = "Rejected"
-
-                self.update_thumbnail_status(filename)
-
-            except Exception as e:
-                self.log_box.append(f"⚠️ {filename} failed: {e}")
+            if batch and time.monotonic() - last_emit >= EMIT_INTERVAL:
+                self.processing_thread.scored.emit(batch)
+                batch = {}
+                last_emit = time.monotonic()
+        results.close()
+        if batch:
+            self.processing_thread.scored.emit(batch)
 
-            self.progress.setValue(self.exported)
+    def on_scored(self, batch):
+        # New scores slot into the current filter and order without a model
+        # reset; only a filter change from the user re-sorts everything
+        self.image_scores.update(batch)
+        self.model.set_scores(batch)
+        self.scored.update_scores(batch)
 
-        self.log_box.append(f"\n🎉 {self.exported} photos exported to {approved_folder}")
+    def log_line(self, line):
+        self.log_box.append(line)
 
-    def add_thumbnail(self, img, filename, status):
+    def load_images(self):
+        # Items appear at once with placeholders; thumbnails fill in as the
+        # background pool delivers them
+        self.thumbnails.cancel_pending()
+        self.thumbnail_cache = {}
+        self.image_status = {}
+        self.image_scores = {}
+        self.image_paths = {entry["filename"]: entry["path"] for entry in scan_folder(self.folder_path)}
+        self.model.set_images(self.image_paths)
         try:
-            pil_img = Image.fromarray(img[:, :, ::-1])
-            pil_img.thumbnail((140, 140))
-            qt_img = QImage(pil_img.tobytes(), pil_img.width, pil_img.height, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(qt_img.rgbSwapped())
-            icon = QIcon(pixmap)
-            item = QListWidgetItem(icon, f"{filename} - {status}")
-            item.setData(Qt.UserRole, (img, filename))
-            self.thumb_list.addItem(item)
-        except Exception as e:
-            self.log_box.append(f"❌ Thumbnail failed for {filename}: {e}")
+            self.image_store.reserve(len(self.image_paths))
+        except OSError as e:
+            # Still works, but evicted images are decoded again for culling
+            self.log_box.append(f"⚠️ Not enough disk space to keep every decoded image: {e}")
+
+    def get_thumbnail(self, filename):
+        # Grid pixmap if ready, otherwise a placeholder while it is generated
+        pixmap = self.thumbnail_cache.get(filename)
+        if pixmap is not None:
+            return pixmap
+        self.thumbnails.request(self.image_paths[filename], "grid", self.thumbnail_ready.emit)
+        return self.placeholder
+
+    def on_thumbnail_ready(self, path, size, img):
+        filename = os.path.basename(path)
+        if size != "grid" or self.image_paths.get(filename) != path:
+            return
+        # Unreadable files keep the placeholder instead of being requested again
+        self.thumbnail_cache[filename] = bgr_to_pixmap(img) if img is not None else self.placeholder
+        self.model.thumbnail_changed(filename)
 
-    def update_thumbnail_status(self, filename):
-        for i in range(self.thumb_list.count()):
-            item = self.thumb_list.item(i)
-            img, fname = item.data(Qt.UserRole)
-            if fname == filename:
-                status = self.image_status.get(filename, "Pending")
-                item.setText(f"{fname} - {status}")
-                break
+    def run_culling(self):
+        if not self.image_paths or (self.culling_engine is not None and self.culling_engine.isRunning()):
+            return
+        self.exported = 0
+        self.progress.setValue(0)
+        engine = CullingEngine(
+            self.image_paths,
+            self.folder_path,
+            eyes=self.eyes_cb.isChecked(),
+            smile=self.smile_cb.isChecked(),
+            duplicates=self.dup_cb.isChecked(),
+            export_count=50,
+            export_mode=self.export_mode.currentText(),
+            cache=self.analysis_cache,
+            store=self.image_store,
+            parent=self,
+        )
+        engine.sorting.connect(self.on_cull_sorting)
+        engine.progress.connect(self.on_cull_progress)
+        engine.log.connect(lambda lines: self.log_box.append("\n".join(lines)))
+        engine.statuses.connect(self.on_cull_statuses)
+        engine.done.connect(self.on_cull_done)
+        self.culling_engine = engine
+        self.start_btn.setEnabled(False)
+        self.pause_btn.setEnabled(True)
+        self.pause_btn.setText("Pause")
+        self.cancel_btn.setEnabled(True)
+        engine.start()
+
+    def toggle_pause(self):
+        engine = self.culling_engine
+        if engine is None:
+            return
+        if engine.paused:
+            engine.resume()
+            self.pause_btn.setText("Pause")
+        else:
+            engine.pause()
+            self.pause_btn.setText("Resume")
+
+    def cancel_culling(self):
+        if self.culling_engine is not None:
+            self.culling_engine.cancel()
+            self.cancel_btn.setEnabled(False)
+
+    def on_cull_sorting(self, scored, total):
+        self.progress.setFormat("Sorting by sharpness: %v/%m")
+        self.progress.setMaximum(total or 1)
+        self.progress.setValue(scored)
+
+    def on_cull_progress(self, exported, processed, total):
+        self.exported = exported
+        self.progress.setFormat("%p%")
+        self.progress.setMaximum(min(self.culling_engine.export_count, total) or 1)
+        self.progress.setValue(exported)
+
+    def on_cull_statuses(self, statuses):
+        self.image_status.update(statuses)
+        for filename in statuses:
+            self.update_thumbnail_status(filename)
+
+    def on_cull_done(self, summary):
+        reducer = self.culling_engine.reducer
+        if reducer is not None:
+            self.face_index = reducer.face_index
+            self.hash_index = reducer.hash_index
+        self.start_btn.setEnabled(True)
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        if summary["cancelled"]:
+            self.log_box.append(f"\n⏹ Cancelled after {summary['processed']} photos")
+        self.log_box.append(f"\n🎉 {summary['exported']} photos exported to {summary['approved_folder']}")
+        # Scoring for the grid runs after culling so the two don't compete for cores
+        if not summary["cancelled"] and not self.processing_thread.isRunning():
+            self.processing_thread.start()
 
-    def preview_full_image(self, item):
-        img, fname = item.data(Qt.UserRole)
+    def update_thumbnail_status(self, filename):
+        self.model.set_status(filename, self.image_status.get(filename, "Pending"))
+
+    def preview_full_image(self, index):
+        path, fname = index.data(PathRole), index.data(Qt.DisplayRole)
+        img = self.thumbnails.get(path, "preview")
+        if img is None:
+            self.log_box.append(f"❌ Could not open {fname}")
+            return
+        sharpness = (self.image_scores.get(fname) or {}).get("sharpness")
+        if self.focus_cb.isChecked() and sharpness:
+            img = focus_overlay(img, sharpness["map"])
         win = QWidget()
         win.setWindowTitle(fname)
         layout = QVBoxLayout()
         label = QLabel()
-        pixmap = QPixmap.fromImage(QImage(img[:, :, ::-1].tobytes(), img.shape[1], img.shape[0], QImage.Format_RGB888).rgbSwapped())
+        pixmap = bgr_to_pixmap(img)
         label.setPixmap(pixmap.scaledToWidth(800, Qt.SmoothTransformation))
         layout.addWidget(label)
         win.setLayout(layout)
         win.resize(820, 600)
         win.show()
+        # Keep a reference, otherwise the window is collected as soon as we return
+        self.preview_window = win
 
     def export_selected(self):
         threshold = self.export_threshold.value()
         export_dir = QFileDialog.getExistingDirectory(self, "Select Export Directory")
         
         if export_dir:
-            exported = 0
+            exporter = Exporter(export_dir, mode=self.export_mode.currentText(),
+                                manifest_path=os.path.join(export_dir, MANIFEST_NAME))
             for filename, scores in self.image_scores.items():
                 if scores["total"] >= threshold:
-                    src = os.path.join(self.folder_path, filename)
-                    dst = os.path.join(export_dir, filename)
-                    shutil.copy2(src, dst)
-                    exported += 1
+                    exporter.submit(self.image_paths[filename], True)
+            summary = exporter.close()
+            for entry in summary["errors"]:
+                self.log_box.append(f"⚠️ {entry['filename']} export failed: {entry['error']}")
             
-            QMessageBox.information(
-                self,
-                "Export Complete",
-                f"Exported {exported} images with score >= {threshold}"
-            )
+            count = summary['approved'] - len(summary['errors'])
+            if exporter.mode == "manifest":
+                # Nothing was placed in export_dir, only recorded
+                message = f"Recorded {count} images with score >= {threshold} in {exporter.manifest_path}"
+            else:
+                message = f"Exported {count} images with score >= {threshold}"
+            QMessageBox.information(self, "Export Complete", message)
+
+    def closeEvent(self, event):
+        if self.culling_engine is not None:
+            self.culling_engine.cancel()
+            self.culling_engine.wait()
+        self.processing_thread.requestInterruption()
+        self.processing_thread.wait()
+        self.thumbnails.close()
+        self.image_store.close()
+        self.analysis_cache.close()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
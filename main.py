@@ -1,94 +1,206 @@
-
+import argparse
 import os
-import shutil
-import numpy as np
-from core.sorter import sort_images_by_blur
-from utils.image_loader import load_images_from_folder
-from core.face_filter import detect_face_attributes
-from core.face_cluster import get_face_embedding, get_image_hash, are_images_duplicates
-from core.analyzer import analyze_exposure, calculate_image_score
-
-def main():
-    folder = input("Enter path to image folder: ")
+import sys
+from core.pipeline import run_pipeline, in_order, warm_up, CullReducer, SORT_STAGES, FILTER_STAGES, ANALYZER_VERSION, STORE_SIDE
+from core.burst import burst_ids, burst_order, best_first, DEFAULT_GAP_MS
+from core.sharpness import sort_score
+from utils.analysis_cache import AnalysisCache
+from utils.image_loader import list_image_paths
+from utils.image_store import ImageStore
+from utils.exporter import Exporter, EXPORT_MODES, MANIFEST_NAME
+from utils.journal import RunJournal, JOURNAL_NAME
+from utils import instrumentation
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ailbums", description="Cull a folder of photos.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cull = commands.add_parser("cull", help="keep the sharpest unique photos with open eyes and smiles")
+    cull.add_argument("folder", help="folder of images")
+    cull.add_argument("--workers", type=int, default=int(os.environ.get("AILBUMS_WORKERS", "0")) or None,
+                      help="analysis processes (default: all cores; 1 analyzes lazily in-process)")
+    cull.add_argument("--limit", type=int, default=50, help="stop after this many approved photos")
+    cull.add_argument("--hash-threshold", type=int, default=5,
+                      help="max perceptual-hash distance for two frames to count as duplicates")
+    cull.add_argument("--face-threshold", type=float, default=0.6,
+                      help="max face-embedding distance for two faces to count as the same person")
+    cull.add_argument("--burst-gap-ms", type=int, default=DEFAULT_GAP_MS,
+                      help="frames closer than this (same camera) form a burst")
+    cull.add_argument("--no-eyes", dest="eyes", action="store_false", help="don't reject closed eyes")
+    cull.add_argument("--no-smile", dest="smile", action="store_false", help="don't reject missing smiles")
+    cull.add_argument("--no-duplicates", dest="duplicates", action="store_false", help="don't reject duplicates")
+    cull.add_argument("--export-mode", choices=EXPORT_MODES, default=os.environ.get("AILBUMS_EXPORT_MODE", "copy"))
+    cull.add_argument("--rejected-mode", choices=EXPORT_MODES,
+                      default=os.environ.get("AILBUMS_REJECTED_MODE", "manifest"))
+    cull.add_argument("--journal", help=f"journal file (default: <folder>/{JOURNAL_NAME})")
+    cull.add_argument("--fresh", action="store_true", help="ignore an existing journal and start over")
+    cull.add_argument("--no-cache", dest="cache", action="store_false", help="don't use the analysis cache")
+    cull.add_argument("--metrics", action="store_true", default=instrumentation.enabled(),
+                      help="time every stage and print a summary table at the end")
+    cull.add_argument("--trace-dir", help="write a cProfile trace per analyzed image to this folder")
+    cull.add_argument("--warm-up", action="store_true",
+                      help="load the face and hash libraries before starting instead of on first use")
+    return parser
+
+
+def cull(args):
+    folder = args.folder
     if not os.path.isdir(folder):
         print("Invalid folder.")
-        return
-
-    print("Loading images...")
-    images = load_images_from_folder(folder)
+        return 1
+
+    # Anything that changes a decision must match for a journal to be resumed
+    settings = {
+        "folder": os.path.abspath(folder),
+        "version": ANALYZER_VERSION,
+        "eyes": args.eyes,
+        "smile": args.smile,
+        "duplicates": args.duplicates,
+        "hash_threshold": args.hash_threshold,
+        "face_threshold": args.face_threshold,
+        "burst_gap_ms": args.burst_gap_ms,
+    }
+    instrumentation.enable(args.metrics)
+    if args.trace_dir:
+        instrumentation.set_trace_dir(args.trace_dir)
+    journal = RunJournal(args.journal or os.path.join(folder, JOURNAL_NAME), settings, fresh=args.fresh)
+    workers = args.workers
+    cache = AnalysisCache(version=ANALYZER_VERSION) if args.cache else None
+    paths = list_image_paths(folder)
+    # Both passes map the same decoded pixels instead of decoding twice
+    store = ImageStore(max_side=STORE_SIDE)
+    try:
+        store.reserve(len(paths))
+    except OSError as e:
+        print(f"Warning: not enough disk space to keep every decoded image, "
+              f"some will be decoded twice: {e}")
+
+    if args.warm_up:
+        # Before any pool exists, so forked workers inherit the loaded libraries;
+        # faces are encoded by the reducer, in this process
+        warm_up(FILTER_STAGES + ("encodings",), load_models=workers == 1)
 
     print("Sorting images by sharpness...")
-    results = sort_images_by_blur(images)
-    sorted_results = sorted(results.items(), key=lambda x: x[1], reverse=True)
+    results = {}
+    for result in run_pipeline(paths, SORT_STAGES, workers, cache, store):
+        # Subject sharpness, so a sharp portrait on a soft background isn't ranked as blurry
+        score = sort_score(result) if result["error"] is None else None
+        if score is not None:
+            results[result["filename"]] = score
+    # Ties broken by name so the order, and a resumed run, doesn't depend on completion order
+    sorted_results = sorted(results.items(), key=lambda x: (-x[1], x[0]))
 
     print("\nTop sharpest photos:")
     for filename, score in sorted_results[:10]:
         print(f"{filename}: {score:.2f}")
 
-    # Create export folders
-    export_count = 50
     approved_folder = os.path.join(folder, "Approved")
     rejected_folder = os.path.join(folder, "Rejected")
-    os.makedirs(approved_folder, exist_ok=True)
-    os.makedirs(rejected_folder, exist_ok=True)
+    # Absolute like the journal's paths, whichever way the folder was given
+    ordered_paths = [os.path.join(os.path.abspath(folder), filename) for filename, _ in sorted_results]
+    # Burst frames are only deduplicated against their own burst, which is
+    # reduced as one run, best frame first
+    bursts = burst_ids(ordered_paths, args.burst_gap_ms) if args.duplicates else {}
+    ordered_paths = burst_order(ordered_paths, bursts)
+    reducer = CullReducer(
+        eyes=args.eyes,
+        smile=args.smile,
+        duplicates=args.duplicates,
+        hash_threshold=args.hash_threshold,
+        face_threshold=args.face_threshold,
+        bursts=bursts,
+    )
+
+    # Replay what an interrupted run already decided instead of redoing it
+    exported = 0
+    for record in journal.records:
+        reducer.restore(record["path"], record["filename"], record["committed"])
+        exported += record["approved"]
+    decided = journal.decided()
+    if decided:
+        print(f"\nResuming: {len(decided)} photos already decided, {exported} approved")
+    remaining = [path for path in ordered_paths if path not in decided]
+
+    # Approved images are copied (or linked); rejected ones are only recorded
+    # in the manifest and an XMP sidecar unless --rejected-mode says otherwise
+    exporter = Exporter(
+        approved_folder,
+        rejected_folder,
+        mode=args.export_mode,
+        rejected_mode=args.rejected_mode,
+        manifest_path=os.path.join(folder, MANIFEST_NAME),
+        resume=bool(decided),
+    )
+
+    def journal_entry(committed):
+        def on_done(entry):
+            if not entry["error"]:
+                journal.append(entry["source"], entry["status"] == "approved", entry["reasons"], committed)
+        return on_done
 
     print("\nAnalyzing faces and filtering...")
-    exported = 0
-    seen_hashes = []
-    known_embeddings = []
-    
-    # Process images in batches
-    batch_size = 10
-    for i in range(0, len(sorted_results), batch_size):
-        batch = sorted_results[i:i + batch_size]
-        
-        for filename, _ in batch:
-            if exported >= export_count:
+    # Per-image analysis fans out to worker processes; only the dedup and
+    # identity decisions run sequentially, in sharpness order. Faces are
+    # encoded there too, only for images the cheaper checks let through. With
+    # a single worker nothing is precomputed and the reducer's cascade
+    # computes each stage only if the image hasn't been rejected yet.
+    precompute = () if workers == 1 else FILTER_STAGES
+    analyses = run_pipeline(remaining if exported < args.limit else [], precompute, workers, cache, store)
+    try:
+        for result in best_first(in_order(analyses, remaining), bursts):
+            if exported >= args.limit:
                 break
 
-        if exported >= export_count:
-            break
-
-        src_path = os.path.join(folder, filename)
-        img = images[filename]
-
-        try:
-            # Filter: eyes open + smiling
-            attributes = detect_face_attributes(img)
-            if not (attributes["eyes_open"] and attributes["smiling"]):
-                dst = os.path.join(rejected_folder, filename)
-                shutil.copyfile(src_path, dst)
-                continue
-
-            # Filter: duplicates
-            img_hash = get_image_hash(img)
-            if any(are_images_duplicates(img_hash, h) for h in seen_hashes):
-                dst = os.path.join(rejected_folder, filename)
-                shutil.copyfile(src_path, dst)
-                continue
-            seen_hashes.append(img_hash)
-
-            # Filter: already seen person (based on embedding)
-            embedding = get_face_embedding(img)
-            if embedding is not None:
-                if any(np.linalg.norm(embedding - e) < 0.6 for e in known_embeddings):
-                    dst = os.path.join(rejected_folder, filename)
-                    shutil.copyfile(src_path, dst)
-                    continue
-                known_embeddings.append(embedding)
-
-            # Passed all filters
-            dst = os.path.join(approved_folder, filename)
-            shutil.copyfile(src_path, dst)
-            exported += 1
-
-        except Exception as e:
-            print(f"Error with {filename}: {e}")
-            dst = os.path.join(rejected_folder, filename)
-            shutil.copyfile(src_path, dst)
+            filename = result["filename"]
+
+            # With one worker the stages run lazily inside reduce(), so that's what gets traced
+            with instrumentation.trace("reduce", result["path"]):
+                approved, reasons = reducer.reduce(result)
+            if result["error"]:
+                print(f"Error with {filename}: {result['error']}")
+            for stage, error in result["errors"].items():
+                print(f"Error with {filename} ({stage}): {error}")
+
+            # Journaled only once the export is done, so a killed run redoes unfinished ones
+            exporter.submit(result["path"], approved, reasons, on_done=journal_entry(reducer.committed))
+            if approved:
+                exported += 1
+    finally:
+        analyses.close()
+        summary = exporter.close()
+        journal.close()
+        if cache is not None:
+            cache.close()
+        store.close()
+    for entry in summary["errors"]:
+        print(f"Export failed for {entry['filename']}: {entry['error']}")
+
+    print("\nFilter stages (run order):")
+    for row in reducer.report():
+        print(f"  {row['stage']:<10} {row['calls']:>6} checked  {row['rejects']:>6} rejected  {row['mean_ms']:8.2f} ms avg")
+
+    if args.metrics:
+        print("\nStage timings (slowest total first):")
+        print(instrumentation.format_report(instrumentation.registry.report()))
 
     print(f"\n✅ Exported {exported} unique, smiling, eyes-open, sharp photos to: {approved_folder}")
-    print(f"❌ Other photos moved to: {rejected_folder}")
+    if exporter.rejected_mode == "manifest":
+        print(f"❌ Rejected photos left in place and listed in: {exporter.manifest_path}")
+    else:
+        print(f"❌ Other photos exported to: {rejected_folder}")
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        # No arguments: the original interactive prompt, with default settings
+        argv = ["cull", input("Enter path to image folder: ")]
+    args = build_parser().parse_args(argv)
+    if args.command == "cull":
+        return cull(args)
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
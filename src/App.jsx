@@ -3,7 +3,6 @@ import * as Checkbox from '@radix-ui/react-checkbox'
 import * as Progress from '@radix-ui/react-progress'
 import * as Select from '@radix-ui/react-select'
 import * as Slider from '@radix-ui/react-slider'
-import axios from 'axios'
 
 function App() {
   const [images, setImages] = useState([])
@@ -28,37 +27,58 @@ function App() {
     setProcessing(true)
     setError(null)
     const processedResults = []
-    
-    for (let i = 0; i < images.length; i++) {
-      const formData = new FormData()
-      formData.append('file', images[i])
-      
-      try {
-        const response = await axios.post('http://localhost:8000/cull', formData, {
-          headers: {
-            'Content-Type': 'multipart/form-data'
+
+    // One multipart request for the whole selection; the server streams
+    // back one NDJSON line per image as soon as it is analyzed
+    const formData = new FormData()
+    images.forEach((image) => formData.append('files', image))
+
+    try {
+      const response = await fetch('http://localhost:8000/cull/batch', {
+        method: 'POST',
+        body: formData
+      })
+      if (!response.ok) {
+        throw new Error(`Server responded with ${response.status}`)
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let completed = 0
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop()
+
+        for (const line of lines) {
+          if (!line.trim()) continue
+          const result = JSON.parse(line)
+          completed += 1
+          if (result.error) {
+            console.error('Error processing image:', result.filename, result.error)
+          } else {
+            processedResults[result.index] = {
+              file: images[result.index],
+              analysis: result.analysis
+            }
           }
-        })
-        
-        processedResults.push({
-          file: images[i],
-          analysis: response.data
-        })
-        
-        setProgress(((i + 1) / images.length) * 100)
-      } catch (error) {
-        console.error('Error processing image:', {
-          message: error.message,
-          status: error.response?.status,
-          data: error.response?.data
-        })
-        setError(`Failed to process image: ${error.message}. Please ensure the backend server is running.`)
-        setProcessing(false)
-        return
+          setProgress((completed / images.length) * 100)
+        }
       }
+    } catch (error) {
+      console.error('Error processing images:', {
+        message: error.message
+      })
+      setError(`Failed to process images: ${error.message}. Please ensure the backend server is running.`)
+      setProcessing(false)
+      return
     }
-    
-    setResults(processedResults)
+
+    setResults(processedResults.filter(Boolean))
     setProcessing(false)
   }
 
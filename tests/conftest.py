@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from anywhere: the packages live at the repo root, as for main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
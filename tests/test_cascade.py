@@ -0,0 +1,191 @@
+import random
+import numpy as np
+import pytest
+from core.cascade import Stage, FilterCascade
+from core.pipeline import CullReducer
+
+
+class Filters:
+    """Stand-ins for the reducer's face -> duplicate -> identity stages: a
+    stateless check followed by two that depend on what was committed."""
+
+    def __init__(self):
+        self.groups = set()
+        self.people = set()
+        self.commits = []
+
+    def face(self, item):
+        return not item["face_ok"], [] if item["face_ok"] else ["face"]
+
+    def duplicate(self, item):
+        reject = item["group"] in self.groups
+        return reject, ["duplicate"] if reject else []
+
+    def commit_duplicate(self, item):
+        self.groups.add(item["group"])
+        self.commits.append(("duplicate", item["id"]))
+
+    def identity(self, item):
+        reject = bool(item["people"]) and item["people"] <= self.people
+        return reject, ["identity"] if reject else []
+
+    def commit_identity(self, item):
+        self.people |= item["people"]
+        self.commits.append(("identity", item["id"]))
+
+    def stages(self):
+        return [
+            Stage("face", self.face),
+            Stage("duplicate", self.duplicate, self.commit_duplicate),
+            Stage("identity", self.identity, self.commit_identity),
+        ]
+
+    def fixed(self, item):
+        # The original loop: each filter in turn, state updated as it passes
+        if self.face(item)[0]:
+            return False
+        if self.duplicate(item)[0]:
+            return False
+        self.commit_duplicate(item)
+        if self.identity(item)[0]:
+            return False
+        self.commit_identity(item)
+        return True
+
+
+def random_items(count, seed):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "face_ok": rng.random() < 0.7,
+            "group": rng.randrange(count // 3 + 1),
+            "people": set(rng.sample(range(8), rng.randint(0, 3))),
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_any_run_order_matches_fixed_order(seed):
+    items = random_items(300, seed)
+    reference = Filters()
+    expected = [reference.fixed(item) for item in items]
+
+    filters = Filters()
+    cascade = FilterCascade(filters.stages(), reorder_every=7)
+    rng = random.Random(seed)
+    decisions = []
+    for item in items:
+        # Whatever order the cost model picks, including the worst ones
+        rng.shuffle(cascade.order)
+        decisions.append(cascade.run(item)[0])
+
+    assert decisions == expected
+    assert filters.commits == reference.commits
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_adaptive_matches_fixed_order(seed):
+    items = random_items(500, seed)
+    reference = Filters()
+    expected = [reference.fixed(item) for item in items]
+
+    filters = Filters()
+    cascade = FilterCascade(filters.stages(), adaptive=True, reorder_every=5)
+    assert [cascade.run(item)[0] for item in items] == expected
+    assert filters.commits == reference.commits
+
+
+def test_reorder_puts_cheap_frequent_rejecter_first():
+    filters = Filters()
+    cascade = FilterCascade(filters.stages())
+    for name, calls, rejects, seconds in [
+        ("face", 100, 10, 1.0),
+        ("duplicate", 100, 60, 0.01),
+        ("identity", 100, 0, 0.5),
+    ]:
+        stats = cascade.stats[name]
+        stats.calls, stats.rejects, stats.seconds = calls, rejects, seconds
+    cascade.reorder()
+    assert [stage.name for stage in cascade.order] == ["duplicate", "face", "identity"]
+
+
+def test_reorder_happens_every_n_items():
+    filters = Filters()
+    cascade = FilterCascade(filters.stages(), reorder_every=3)
+    calls = []
+    cascade.reorder = lambda: calls.append(cascade.items)
+    for item in random_items(10, 0):
+        cascade.run(item)
+    assert calls == [3, 6, 9]
+
+    fixed = FilterCascade(Filters().stages(), adaptive=False, reorder_every=3)
+    fixed.reorder = lambda: pytest.fail("reordered with adaptive=False")
+    for item in random_items(10, 0):
+        fixed.run(item)
+
+
+def test_early_reject_skips_commits_and_later_checks():
+    checked = []
+
+    def check(name, reject):
+        def run(item):
+            checked.append(name)
+            return reject, [name] if reject else []
+        return run
+
+    commits = []
+    stages = [
+        Stage("face", check("face", True)),
+        Stage("duplicate", check("duplicate", False), lambda item: commits.append("duplicate")),
+        Stage("identity", check("identity", False), lambda item: commits.append("identity")),
+    ]
+    cascade = FilterCascade(stages)
+    assert cascade.run({}) == (False, ["face"])
+    # Nothing before the rejecting stage commits, so nothing after it is checked
+    assert checked == ["face"]
+    assert commits == []
+
+    checked.clear()
+    stages[0].check = check("face", False)
+    stages[2].check = check("identity", True)
+    cascade.order = [stages[2], stages[1], stages[0]]
+    assert cascade.run({})[0] is False
+    # Identity rejected first, but duplicate's commit still depends on face
+    assert sorted(checked) == ["duplicate", "face", "identity"]
+    assert commits == ["duplicate"]
+    assert cascade.stats["identity"].rejects == 1
+
+
+def random_results(count, seed):
+    # Precomputed reducer inputs: faces, a packed phash and one encoding per face
+    rng = np.random.default_rng(seed)
+    people = rng.standard_normal((6, 128)).astype(np.float32)
+    bases = [int(rng.integers(0, 1 << 62)) for _ in range(count // 4 + 1)]
+    results = []
+    for i in range(count):
+        who = rng.choice(len(people), size=rng.integers(0, 3), replace=False)
+        faces = [{"eyes_open": rng.random() < 0.8, "smiling": rng.random() < 0.8} for _ in who]
+        img_hash = bases[rng.integers(len(bases))] ^ (1 << int(rng.integers(64)))
+        encodings = [people[p] + rng.normal(0, 0.02, 128).astype(np.float32) for p in who]
+        results.append({
+            "filename": f"{i:04d}.jpg", "path": f"/shoot/{i:04d}.jpg", "error": None, "errors": {},
+            "faces": faces, "hash": img_hash, "encodings": encodings,
+        })
+    return results
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_reducer_adaptive_matches_fixed_order(seed):
+    fixed = CullReducer(adaptive=False)
+    adaptive = CullReducer(adaptive=True)
+    adaptive.cascade.reorder_every = 3
+    rng = random.Random(seed)
+    for result in random_results(200, seed):
+        expected = fixed.reduce(dict(result))[0]
+        rng.shuffle(adaptive.cascade.order)
+        assert adaptive.reduce(dict(result))[0] == expected
+        assert adaptive.committed.keys() == fixed.committed.keys()
+    assert len(adaptive.hash_index) == len(fixed.hash_index)
+    assert len(adaptive.face_index) == len(fixed.face_index)
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from core.face_cluster import EmbeddingIndex, cluster_embeddings
+
+
+def brute_force(gallery, queries):
+    # The per-pair np.linalg.norm scan EmbeddingIndex replaced
+    distances = np.array([[np.linalg.norm(q - g) for g in gallery] for q in queries])
+    ids = distances.argmin(axis=1)
+    return ids, distances[np.arange(len(queries)), ids]
+
+
+def people(count, per_person, seed, noise=0.01):
+    # Face-like embeddings: norm about 1, the same person within ~0.2 and
+    # different people ~1.6 apart, either side of the 0.6 threshold
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0, 0.1, (count, 128)).astype(np.float32)
+    vectors = np.repeat(centres, per_person, axis=0) + rng.normal(0, noise, (count * per_person, 128)).astype(np.float32)
+    return vectors, np.repeat(np.arange(count), per_person)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("capacity", [0, 1, 256])
+def test_exact_nearest_matches_brute_force(seed, capacity):
+    rng = np.random.default_rng(seed)
+    gallery = rng.standard_normal((300, 128)).astype(np.float32)
+    queries = rng.standard_normal((40, 128)).astype(np.float32)
+    index = EmbeddingIndex(capacity=capacity)
+    # Added in uneven chunks so the buffer grows while in use
+    for start, stop in [(0, 1), (1, 17), (17, 300)]:
+        index.add_many(gallery[start:stop])
+    assert len(index) == 300
+
+    ids, dists = index.nearest_many(queries)
+    expected_ids, expected = brute_force(gallery, queries)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(dists, expected, rtol=1e-4)
+    for query, i, d in zip(queries, expected_ids, expected):
+        got_id, got = index.nearest(query)
+        assert got_id == i
+        assert got == pytest.approx(d, rel=1e-4)
+        assert index.contains(query, d + 1e-3)
+        assert not index.contains(query, d - 1e-3)
+
+
+def test_empty_index():
+    index = EmbeddingIndex(capacity=0)
+    assert index.nearest(np.zeros(128)) == (None, float("inf"))
+    assert not index.contains(np.zeros(128))
+    ids, dists = index.nearest_many(np.zeros((3, 128)))
+    assert ids.tolist() == [-1, -1, -1]
+    assert np.isinf(dists).all()
+    assert index.add(np.ones(128)) == 0
+    assert index.nearest(np.ones(128))[0] == 0
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_approximate_finds_near_duplicates(seed):
+    gallery, _ = people(50, 4, seed)
+    exact = EmbeddingIndex()
+    approximate = EmbeddingIndex(approximate=True, seed=seed)
+    exact.add_many(gallery)
+    approximate.add_many(gallery)
+
+    # Another photo of an indexed face is what the identity check asks about
+    rng = np.random.default_rng(seed + 100)
+    queries = gallery[rng.choice(len(gallery), 100)] + rng.normal(0, 0.01, (100, 128)).astype(np.float32)
+    exact_ids, exact_dists = exact.nearest_many(queries)
+    ids, dists = approximate.nearest_many(queries)
+
+    found = ids >= 0
+    # Candidates are checked exactly, so a hit is never closer than the true nearest
+    assert (dists[found] >= exact_dists[found] - 1e-4).all()
+    np.testing.assert_allclose(dists[found], np.linalg.norm(queries[found] - gallery[ids[found]], axis=1), rtol=1e-4)
+    assert (ids == exact_ids).mean() >= 0.9
+    # Near duplicates at the reducer's threshold are what matters
+    assert (dists < 0.6).mean() >= 0.95
+
+
+def test_cluster_embeddings_groups_people():
+    vectors, truth = people(4, 6, seed=1)
+    order = np.random.default_rng(1).permutation(len(vectors))
+    labels = cluster_embeddings(vectors[order], threshold=0.6)
+    truth = truth[order]
+    # Same partition as the ground truth, whatever the label numbers
+    for person in range(4):
+        assert len(set(labels[truth == person].tolist())) == 1
+    assert len(set(labels.tolist())) == 4
+    # Labels are numbered in order of first appearance
+    first_seen = list(dict.fromkeys(labels.tolist()))
+    assert first_seen == list(range(4))
+
+
+def test_cluster_embeddings_keeps_strangers_apart():
+    vectors, _ = people(5, 1, seed=2)
+    assert sorted(cluster_embeddings(vectors).tolist()) == [0, 1, 2, 3, 4]
+    assert cluster_embeddings(np.empty((0, 128))).tolist() == []
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+from core.face_cluster import get_image_hash, hash_to_int, HASH_SIDE
+from core.hashing import hash_images, phash
+from utils.image_loader import resize_to_side
+
+imagehash = pytest.importorskip("imagehash")
+
+KINDS = {
+    "phash": lambda image: imagehash.phash(image),
+    "dhash": lambda image: imagehash.dhash(image),
+    "ahash": lambda image: imagehash.average_hash(image),
+}
+
+
+def random_images(count, seed):
+    # Noise at odd sizes, every other one blurred so low frequencies dominate
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        height, width = int(rng.integers(8, HASH_SIDE + 1)), int(rng.integers(8, HASH_SIDE + 1))
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        if i % 2:
+            image = cv2.GaussianBlur(image, (0, 0), float(rng.uniform(0.5, 20)))
+        images.append(image)
+    return images
+
+
+def gradient_images():
+    ramp = np.tile(np.arange(256, dtype=np.uint8), (HASH_SIDE, 1))
+    return [np.dstack([ramp] * 3), np.dstack([ramp.T] * 3), np.dstack([ramp, ramp.T, 255 - ramp])]
+
+
+def flat_images():
+    return [np.full((HASH_SIDE * 2 // 3, HASH_SIDE, 3), value, np.uint8) for value in (0, 1, 77, 128, 254, 255)]
+
+
+def reference(images, kind):
+    # imagehash on the RGB PIL image it would be given, packed like ours
+    return [hash_to_int(KINDS[kind](Image.fromarray(np.ascontiguousarray(image[:, :, ::-1])))) for image in images]
+
+
+CASES = {
+    "random": lambda: random_images(60, 0),
+    "gradient": gradient_images,
+    "flat": flat_images,
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("kind", KINDS)
+def test_matches_imagehash(case, kind):
+    images = CASES[case]()
+    actual = [int(h) for h in hash_images(images, (kind,))[kind]]
+    assert actual == reference(images, kind)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_single_image_phash_matches_batch(seed):
+    images = random_images(10, seed)
+    batch = [int(h) for h in hash_images(images)["phash"]]
+    assert [phash(image) for image in images] == batch
+    assert batch == reference(images, "phash")
+
+
+def test_gray_input_matches_bgr():
+    gray = random_images(1, 7)[0][:, :, 0].copy()
+    assert phash(gray) == phash(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+
+
+def test_pipeline_hash_is_phash_at_hash_side():
+    image = random_images(2, 3)[1]
+    large = cv2.resize(image, (HASH_SIDE * 3, HASH_SIDE * 2))
+    assert get_image_hash(large) == phash(resize_to_side(large, HASH_SIDE))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from core.metrics import (
+    count_peaks, find_histogram_peaks, peak_prominences, smooth_histogram, compute_metrics,
+)
+
+signal = pytest.importorskip("scipy.signal")
+
+
+def histograms(count, seed=0):
+    # Normalized 256-bin histograms: noisy multi-modal ones, plateaus, flat,
+    # single-spike and empty-edge cases
+    rng = np.random.default_rng(seed)
+    levels = np.arange(256)
+    hists = []
+    for i in range(count):
+        hist = np.zeros(256)
+        for _ in range(rng.integers(1, 5)):
+            centre, width = rng.uniform(0, 255), rng.uniform(2, 40)
+            hist += rng.uniform(0.2, 1) * np.exp(-0.5 * ((levels - centre) / width) ** 2)
+        hist += rng.uniform(0, 0.05) * rng.random(256)
+        if i % 4 == 0:
+            # Integer counts give the flat-topped runs real histograms have
+            hist = np.round(hist * rng.integers(5, 50))
+        hists.append(hist / max(hist.sum(), 1e-12))
+    hists.append(np.full(256, 1 / 256))
+    spike = np.zeros(256)
+    spike[128] = 1
+    hists.append(spike)
+    plateau = np.zeros(256)
+    plateau[100:110] = 0.1
+    hists.append(plateau)
+    return hists
+
+
+@pytest.mark.parametrize("hist", histograms(200))
+def test_peaks_match_scipy(hist):
+    np.testing.assert_array_equal(find_histogram_peaks(hist, smooth=0, prominence=0), signal.find_peaks(hist)[0])
+
+
+@pytest.mark.parametrize("hist", histograms(100, seed=1))
+@pytest.mark.parametrize("smooth,prominence", [(0, 0.001), (2, 0.002), (4, 0.01)])
+def test_smoothed_prominent_peaks_match_scipy(hist, smooth, prominence):
+    smoothed = smooth_histogram(hist, smooth)
+    expected = signal.find_peaks(smoothed, prominence=prominence)[0]
+    np.testing.assert_array_equal(find_histogram_peaks(hist, smooth, prominence), expected)
+
+
+@pytest.mark.parametrize("hist", histograms(100, seed=2))
+def test_prominences_match_scipy(hist):
+    peaks = signal.find_peaks(hist)[0]
+    np.testing.assert_allclose(peak_prominences(hist, peaks), signal.peak_prominences(hist, peaks)[0], atol=1e-12)
+
+
+def test_count_peaks_batch_matches_rows():
+    hists = np.stack(histograms(60, seed=3))
+    for smooth, prominence in [(0, 0), (2, 0.002)]:
+        expected = [len(find_histogram_peaks(h, smooth, prominence)) for h in hists]
+        np.testing.assert_array_equal(count_peaks(hists, smooth, prominence), expected)
+
+
+def test_default_peak_count_is_the_original_scipy_count():
+    # analyze_exposure's "peaks" used to be len(scipy find_peaks(hist))
+    rng = np.random.default_rng(4)
+    image = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    metrics = compute_metrics(image)
+    assert metrics["peaks"] == len(signal.find_peaks(metrics["hist"])[0])
@@ -0,0 +1,13 @@
+import pytest
+from benchmarks.import_budget import ENTRY_POINTS, measure
+
+
+@pytest.mark.parametrize("module", ["core.pipeline", "main", "api.main"])
+def test_entry_point_defers_heavy_backends(module):
+    # A fresh interpreter per entry point; timing is left to the benchmark
+    try:
+        _, loaded = measure(module)
+    except RuntimeError as e:
+        pytest.skip(f"{module} does not import here: {e}")
+    _, forbidden = ENTRY_POINTS[module]
+    assert sorted(set(forbidden) & loaded) == []
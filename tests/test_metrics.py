@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from core.metrics import compute_metrics, compute_metrics_batch
+
+
+def test_batch_of_nothing():
+    assert compute_metrics_batch([]) == []
+    assert compute_metrics_batch(np.empty((0, 16, 16, 3), np.uint8)) == []
+
+
+@pytest.mark.parametrize("channels", [3, None])
+def test_batch_matches_single_image(channels):
+    rng = np.random.default_rng(0)
+    shape = (5, 40, 56, channels) if channels else (5, 40, 56)
+    stack = rng.integers(0, 256, shape, dtype=np.uint8)
+    for batched, image in zip(compute_metrics_batch(stack), stack):
+        single = compute_metrics(image)
+        for key in ("blur", "mean", "std", "peaks"):
+            assert batched[key] == pytest.approx(single[key])
+        np.testing.assert_allclose(batched["hist"], single["hist"])
@@ -0,0 +1,61 @@
+import random
+import pytest
+from core.face_cluster import PhashIndex, are_images_duplicates, hamming_distance
+
+
+def random_hashes(count, seed):
+    # Bursts of near-copies around random bases, so radius 5 has hits and misses
+    rng = random.Random(seed)
+    hashes = []
+    while len(hashes) < count:
+        base = rng.getrandbits(64)
+        hashes.append(base)
+        for _ in range(rng.randint(0, 6)):
+            variant = base
+            for bit in rng.sample(range(64), rng.randint(0, 10)):
+                variant ^= 1 << bit
+            hashes.append(variant)
+    return hashes[:count]
+
+
+def linear_contains(seen, img_hash, threshold=5):
+    # The scan PhashIndex replaced in main.py and the GUI
+    return any(are_images_duplicates(img_hash, h, threshold) for h in seen)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_contains_matches_linear_scan_while_culling(seed):
+    # Same insert-if-new loop as the reducer's duplicate stage
+    index = PhashIndex()
+    seen = []
+    for img_hash in random_hashes(1500, seed):
+        expected = linear_contains(seen, img_hash)
+        assert index.contains(img_hash, 5) == expected
+        if not expected:
+            index.insert(img_hash)
+            seen.append(img_hash)
+    assert len(index) == len(seen)
+
+
+@pytest.mark.parametrize("radius", [0, 1, 5, 12])
+def test_query_matches_linear_scan(radius):
+    hashes = random_hashes(800, 7)
+    index = PhashIndex.build(hashes, items=list(range(len(hashes))))
+    for img_hash in random_hashes(200, 8):
+        expected = sorted(
+            (i, hamming_distance(img_hash, h)) for i, h in enumerate(hashes)
+            if hamming_distance(img_hash, h) <= radius
+        )
+        assert sorted(index.query(img_hash, radius)) == expected
+
+
+def test_duplicate_hashes_keep_every_item():
+    index = PhashIndex.build([0xF0F0, 0xF0F0, 0xF0F1], items=["a", "b", "c"])
+    assert sorted(index.query(0xF0F0, 0)) == [("a", 0), ("b", 0)]
+    assert sorted(item for item, _ in index.query(0xF0F0, 1)) == ["a", "b", "c"]
+
+
+def test_empty_index():
+    index = PhashIndex()
+    assert not index.contains(0, 64)
+    assert index.query(0, 64) == []
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+from core.pipeline import run_pipeline, in_order, CullReducer, SORT_STAGES, FILTER_STAGES
+from core.burst import burst_ids, burst_order, best_first
+from core.sharpness import sort_score
+from utils.exporter import Exporter, MANIFEST_NAME
+
+# Minimum seconds between UI updates; everything in between is batched
+EMIT_INTERVAL = 0.05
+
+
+class CullingEngine(QThread):
+    """Runs a whole culling pass off the GUI thread.
+
+    The engine owns the CullReducer (dedup and identity state) for the run.
+    The UI only sees batched, throttled signals:
+      sorting(scored, total) during the sharpness pass
+      progress(exported, processed, total)
+      log(lines)
+      statuses({filename: "Approved" | "Rejected"})
+      done(summary)
+    cancel() stops at the next image; pause()/resume() hold it between images."""
+
+    sorting = pyqtSignal(int, int)
+    progress = pyqtSignal(int, int, int)
+    log = pyqtSignal(list)
+    statuses = pyqtSignal(dict)
+    done = pyqtSignal(dict)
+
+    def __init__(self, image_paths, folder, eyes=True, smile=True, duplicates=True,
+                 export_count=50, export_mode="copy", rejected_mode="manifest",
+                 cache=None, store=None, parent=None):
+        super().__init__(parent)
+        self.image_paths = dict(image_paths)
+        self.folder = folder
+        self.approved_folder = os.path.join(folder, "Approved")
+        self.rejected_folder = os.path.join(folder, "Rejected")
+        self.export_mode = export_mode
+        self.rejected_mode = rejected_mode
+        self.eyes = eyes
+        self.smile = smile
+        self.duplicates = duplicates
+        self.export_count = export_count
+        self.cache = cache
+        self.store = store
+        self.reducer = None
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._lines = []
+        self._statuses = {}
+        self._last_emit = 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def _checkpoint(self):
+        # Blocks while paused; True once the run should stop
+        self._running.wait()
+        return self._cancelled.is_set()
+
+    def _flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_emit < EMIT_INTERVAL:
+            return False
+        self._last_emit = now
+        if self._lines:
+            self.log.emit(self._lines)
+            self._lines = []
+        if self._statuses:
+            self.statuses.emit(self._statuses)
+            self._statuses = {}
+        return True
+
+    def run(self):
+        exporter = Exporter(
+            self.approved_folder,
+            self.rejected_folder,
+            mode=self.export_mode,
+            rejected_mode=self.rejected_mode,
+            manifest_path=os.path.join(self.folder, MANIFEST_NAME),
+        )
+        exported = processed = 0
+        total = len(self.image_paths)
+
+        blur = {}
+        scored = 0
+        sorting = run_pipeline(list(self.image_paths.values()), SORT_STAGES, cache=self.cache, store=self.store)
+        try:
+            for result in sorting:
+                if self._checkpoint():
+                    break
+                score = sort_score(result) if result["error"] is None else None
+                if score is not None:
+                    blur[result["filename"]] = score
+                scored += 1
+                if self._flush():
+                    self.sorting.emit(scored, total)
+        finally:
+            sorting.close()
+        self.sorting.emit(scored, total)
+
+        # Ties broken by name, as in the CLI, so both order a folder the same way every run
+        ranked = sorted(blur.items(), key=lambda x: (-x[1], x[0]))
+        ordered_paths = [self.image_paths[filename] for filename, _ in ranked]
+        bursts = burst_ids(ordered_paths) if self.duplicates else {}
+        ordered_paths = burst_order(ordered_paths, bursts)
+        self.reducer = CullReducer(
+            eyes=self.eyes,
+            smile=self.smile,
+            duplicates=self.duplicates,
+            bursts=bursts,
+        )
+        # What the CLI precomputes, so burst ranking doesn't compute face_focus here one by one
+        stages = tuple(name for name in FILTER_STAGES if self.duplicates or name != "hash")
+
+        analyses = run_pipeline(ordered_paths, stages, cache=self.cache, store=self.store)
+        try:
+            for result in best_first(in_order(analyses, ordered_paths), bursts):
+                if exported >= self.export_count or self._checkpoint():
+                    break
+                filename = result["filename"]
+                try:
+                    approved, reasons = self.reducer.reduce(result)
+                    exporter.submit(result["path"], approved, reasons)
+                    if approved:
+                        exported += 1
+                        self._lines.append(f"✅ {filename}")
+                    else:
+                        self._lines.append(f"❌ {filename}: {'; '.join(reasons)}")
+                    self._statuses[filename] = "Approved" if approved else "Rejected"
+                except Exception as e:
+                    self._lines.append(f"⚠️ {filename} failed: {e}")
+                processed += 1
+                if self._flush():
+                    self.progress.emit(exported, processed, total)
+        finally:
+            analyses.close()
+
+        for entry in exporter.close()["errors"]:
+            self._lines.append(f"⚠️ {entry['filename']} export failed: {entry['error']}")
+        self._flush(force=True)
+        self.progress.emit(exported, processed, total)
+        self.done.emit({
+            "exported": exported,
+            "processed": processed,
+            "cancelled": self._cancelled.is_set(),
+            "approved_folder": self.approved_folder,
+        })
@@ -0,0 +1,77 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (
+    QGroupBox, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView
+)
+from utils import instrumentation
+
+# Seconds between refreshes while timings are being collected
+REFRESH_INTERVAL = 1.0
+
+COLUMNS = (
+    ("Stage", "stage", "{}"),
+    ("Calls", "calls", "{}"),
+    ("Errors", "errors", "{}"),
+    ("Total s", "total_s", "{:.2f}"),
+    ("Mean ms", "mean_ms", "{:.1f}"),
+    ("p50 ms", "p50_ms", "{:.1f}"),
+    ("p90 ms", "p90_ms", "{:.1f}"),
+    ("p99 ms", "p99_ms", "{:.1f}"),
+)
+
+
+class StatsPanel(QGroupBox):
+    """Per-stage timings from utils.instrumentation, slowest total first.
+
+    Collection is off until the checkbox is ticked, so the stages pay nothing
+    for it otherwise. Worker processes started afterwards inherit the setting
+    and their timings are merged in as their results arrive."""
+
+    def __init__(self, parent=None):
+        super().__init__("Stage Timings", parent)
+        self.enabled_cb = QCheckBox("Collect timings")
+        self.enabled_cb.setChecked(instrumentation.enabled())
+        self.enabled_cb.toggled.connect(self.set_collecting)
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _, _ in COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setMaximumHeight(160)
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.enabled_cb)
+        controls.addStretch()
+        controls.addWidget(reset_btn)
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(REFRESH_INTERVAL * 1000))
+        self.timer.timeout.connect(self.refresh)
+        self.set_collecting(instrumentation.enabled())
+
+    def set_collecting(self, on):
+        instrumentation.enable(on)
+        if on:
+            self.timer.start()
+        else:
+            self.timer.stop()
+        self.refresh()
+
+    def reset(self):
+        instrumentation.registry.reset()
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        rows = instrumentation.registry.report()
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, (_, key, fmt) in enumerate(COLUMNS):
+                self.table.setItem(i, j, QTableWidgetItem(fmt.format(row[key])))
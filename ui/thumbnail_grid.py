@@ -0,0 +1,274 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRect
+from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle
+from core.sharpness import sort_score
+
+PathRole = Qt.UserRole
+StatusRole = Qt.UserRole + 1
+ScoresRole = Qt.UserRole + 2
+
+STATUS_COLORS = {
+    "Approved": QColor("#4CAF50"),
+    "Rejected": QColor("#F44336"),
+    "Pending": QColor("#BDBDBD"),
+}
+
+
+def sort_key(scores, sort_by):
+    if sort_by == "blur":
+        return scores["blur"]
+    if sort_by == "focus":
+        # Eye or face sharpness where faces were found, else subject sharpness
+        return sort_score(scores)
+    if sort_by == "exposure":
+        exposure = scores["exposure"]
+        return (exposure["quality"] == "good", -abs(exposure["mean"] - 128))
+    return scores["total"]
+
+
+class ThumbnailModel(QAbstractListModel):
+    """One row per image of the open folder.
+
+    Thumbnails are pulled through `thumbnail_provider(filename)` only when a
+    view asks for a row's decoration, i.e. only for visible cells. A
+    filename -> row index makes status and thumbnail updates O(1)."""
+
+    def __init__(self, thumbnail_provider, parent=None):
+        super().__init__(parent)
+        self.thumbnail_provider = thumbnail_provider
+        self._filenames = []
+        self._paths = {}
+        self._rows = {}
+        self._status = {}
+        self._scores = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._filenames)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        return self.value(self._filenames[index.row()], role)
+
+    def value(self, filename, role):
+        if role == Qt.DisplayRole:
+            return filename
+        if role == Qt.DecorationRole:
+            return self.thumbnail_provider(filename)
+        if role == PathRole:
+            return self._paths[filename]
+        if role == StatusRole:
+            return self._status.get(filename, "Pending")
+        if role == ScoresRole:
+            return self._scores.get(filename)
+        return None
+
+    def set_images(self, image_paths):
+        # image_paths: filename -> path, in display order
+        self.beginResetModel()
+        self._filenames = list(image_paths)
+        self._paths = dict(image_paths)
+        self._rows = {filename: row for row, filename in enumerate(self._filenames)}
+        self._status = {}
+        self._scores = {}
+        self.endResetModel()
+
+    def _changed(self, filename, roles):
+        row = self._rows.get(filename)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, roles)
+
+    def set_status(self, filename, status):
+        self._status[filename] = status
+        self._changed(filename, [StatusRole])
+
+    def thumbnail_changed(self, filename):
+        self._changed(filename, [Qt.DecorationRole])
+
+    def row_of(self, filename):
+        return self._rows.get(filename)
+
+    def filenames(self):
+        return self._filenames
+
+    def scores(self, filename):
+        return self._scores.get(filename)
+
+    def set_scores(self, scores):
+        # Bulk update (filename -> scores dict) with a single change notification
+        self._scores.update(scores)
+        if self._filenames:
+            self.dataChanged.emit(self.index(0), self.index(len(self._filenames) - 1), [ScoresRole])
+
+
+class ScoredGridModel(QAbstractListModel):
+    """Scored images of a ThumbnailModel at or above min_score, best first by
+    the chosen key. A filter change is one sort in Python and a model reset;
+    Qt's sort proxy would call back into Python for every comparison. Images
+    scored later are inserted in place by update_scores(), so views keep their
+    scroll position and selection while scoring runs."""
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.min_score = 0
+        self.sort_by = "score"
+        self._filenames = []
+        # Sort key of each row, kept alongside for binary-search insertion
+        self._keys = []
+        self._rows = {}
+        self._rows_stale = False
+        source.dataChanged.connect(self._source_changed)
+        source.modelReset.connect(self._source_reset)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._filenames)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        return self.source.value(self._filenames[index.row()], role)
+
+    def set_filter(self, min_score, sort_by):
+        self.min_score = min_score
+        self.sort_by = sort_by
+        scored = [
+            (filename, scores) for filename in self.source.filenames()
+            for scores in [self.source.scores(filename)]
+            if scores is not None and scores["total"] >= min_score
+        ]
+        keyed = sorted(((sort_key(scores, sort_by), filename) for filename, scores in scored),
+                       key=lambda item: item[0], reverse=True)
+        self.beginResetModel()
+        self._filenames = [filename for _, filename in keyed]
+        self._keys = [key for key, _ in keyed]
+        self._rows = {filename: row for row, filename in enumerate(self._filenames)}
+        self._rows_stale = False
+        self.endResetModel()
+
+    def _row(self, filename):
+        # Inserts shift every later row, so the index is rebuilt on demand
+        if self._rows_stale:
+            self._rows = {name: row for row, name in enumerate(self._filenames)}
+            self._rows_stale = False
+        return self._rows.get(filename)
+
+    def _position(self, key):
+        # First row whose key is lower (rows are best first); ties go after
+        low, high = 0, len(self._keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self._keys[middle] < key:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def update_scores(self, filenames):
+        """Places images whose scores were added or changed under the current
+        filter: row inserts and removals instead of a reset. Call after the
+        source's set_scores()."""
+        for filename in filenames:
+            scores = self.source.scores(filename)
+            keep = scores is not None and scores["total"] >= self.min_score
+            key = sort_key(scores, self.sort_by) if keep else None
+            row = self._row(filename)
+            if row is not None:
+                if keep and key == self._keys[row]:
+                    index = self.index(row)
+                    self.dataChanged.emit(index, index, [ScoresRole])
+                    continue
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._filenames[row]
+                del self._keys[row]
+                self._rows_stale = True
+                self.endRemoveRows()
+            if not keep:
+                continue
+            row = self._position(key)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._filenames.insert(row, filename)
+            self._keys.insert(row, key)
+            self._rows_stale = True
+            self.endInsertRows()
+
+    def _source_reset(self):
+        self.beginResetModel()
+        self._filenames = []
+        self._keys = []
+        self._rows = {}
+        self._rows_stale = False
+        self.endResetModel()
+
+    def _source_changed(self, top, bottom, roles):
+        if top.row() != bottom.row():
+            if self._filenames:
+                self.dataChanged.emit(self.index(0), self.index(len(self._filenames) - 1), roles)
+            return
+        row = self._row(self.source.filenames()[top.row()])
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, roles)
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Paints a cell (thumbnail, status bar, filename and score line) straight
+    onto the view; no per-image widgets exist."""
+
+    def __init__(self, thumb_size=140, show_scores=False, parent=None):
+        super().__init__(parent)
+        self.thumb_size = thumb_size
+        self.show_scores = show_scores
+        self.text_lines = 2 if show_scores else 1
+
+    def sizeHint(self, option, index):
+        return QSize(self.thumb_size + 16, self.thumb_size + 16 + 16 * self.text_lines)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect.adjusted(4, 4, -4, -4)
+        background = QColor("#BBDEFB") if option.state & QStyle.State_Selected else QColor("white")
+        painter.fillRect(rect, background)
+
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            x = rect.x() + (rect.width() - pixmap.width()) // 2
+            y = rect.y() + 4 + (self.thumb_size - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+
+        status = index.data(StatusRole)
+        bar = QRect(rect.x(), rect.y() + self.thumb_size + 6, rect.width(), 3)
+        painter.fillRect(bar, STATUS_COLORS.get(status, STATUS_COLORS["Pending"]))
+
+        font = QFont(option.font)
+        font.setPointSize(8)
+        painter.setFont(font)
+        painter.setPen(QColor("#212121"))
+        text = QRect(rect.x() + 2, bar.bottom() + 2, rect.width() - 4, 16)
+        name = painter.fontMetrics().elidedText(index.data(Qt.DisplayRole), Qt.ElideMiddle, text.width())
+        painter.drawText(text, Qt.AlignLeft | Qt.AlignVCenter, name)
+
+        scores = index.data(ScoresRole)
+        if self.show_scores and scores is not None:
+            face = scores["face"]
+            line = (
+                f"{scores['total']:.1f}  Eyes {'✓' if face['eyes_open'] else '✗'}  "
+                f"Smile {'✓' if face['smiling'] else '✗'}  Blur {scores['blur']:.0f}  Focus {sort_score(scores):.0f}"
+            )
+            line = painter.fontMetrics().elidedText(line, Qt.ElideRight, text.width())
+            painter.drawText(text.translated(0, 16), Qt.AlignLeft | Qt.AlignVCenter, line)
+        painter.restore()
+
+
+def thumbnail_view(model, delegate, parent=None):
+    # Icon-mode list that only asks the model and delegate for visible cells
+    view = QListView(parent)
+    view.setModel(model)
+    view.setItemDelegate(delegate)
+    view.setViewMode(QListView.IconMode)
+    view.setResizeMode(QListView.Adjust)
+    view.setMovement(QListView.Static)
+    view.setUniformItemSizes(True)
+    view.setSelectionMode(QListView.ExtendedSelection)
+    return view
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ailbums_cache", "analysis.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    data TEXT NOT NULL,
+    arrays BLOB,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (key, stage)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+# Bytes hashed from the start, middle and end of a file for its content hash
+KEY_SAMPLE = 64 * 1024
+
+
+def content_hash(path, sample=KEY_SAMPLE):
+    # Size plus sampled blocks, like utils.thumbnails.thumbnail_key: the
+    # pipeline keys files in its dispatching process, so reading whole
+    # raw-sized files there would serialize all I/O ahead of the workers.
+    # Keys also carry size and mtime, so this only has to tell copies apart
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= 3 * sample:
+            digest.update(f.read())
+        else:
+            for offset in (0, (size - sample) // 2, size - sample):
+                f.seek(offset)
+                digest.update(f.read(sample))
+    return digest.hexdigest()
+
+
+def _encode(value):
+    # JSON for the structure, numpy arrays (embeddings) appended to one BLOB
+    arrays = []
+    offset = 0
+
+    def strip(v):
+        nonlocal offset
+        if isinstance(v, np.ndarray):
+            arrays.append(v.tobytes())
+            marker = {"__array__": offset, "dtype": v.dtype.str, "shape": list(v.shape)}
+            offset += v.nbytes
+            return marker
+        if isinstance(v, dict):
+            return {k: strip(x) for k, x in v.items()}
+        if isinstance(v, (list, tuple)):
+            return [strip(x) for x in v]
+        if isinstance(v, np.generic):
+            return v.item()
+        return v
+
+    data = json.dumps(strip(value))
+    return data, b"".join(arrays)
+
+
+def _decode(data, blob):
+    def restore(v):
+        if isinstance(v, dict):
+            if "__array__" in v:
+                dtype = np.dtype(v["dtype"])
+                count = int(np.prod(v["shape"])) if v["shape"] else 1
+                array = np.frombuffer(blob, dtype=dtype, count=count, offset=v["__array__"])
+                return array.reshape(v["shape"]).copy()
+            return {k: restore(x) for k, x in v.items()}
+        if isinstance(v, list):
+            return [restore(x) for x in v]
+        return v
+
+    return restore(json.loads(data))
+
+
+class AnalysisCache:
+    """Per-stage analysis results keyed by file content, size, mtime and
+    analyzer version, evicted least-recently-used once the database passes
+    max_size_mb. Safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version="1", max_size_mb=512):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.version = str(version)
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def file_key(self, path):
+        # Content hashes are remembered per path, so an unchanged file is only hashed once
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+        if row:
+            digest = row[0]
+        else:
+            digest = content_hash(path)
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                    (path, st.st_size, st.st_mtime_ns, digest),
+                )
+        return f"{digest}:{st.st_size}:{st.st_mtime_ns}:{self.version}"
+
+    def key_for_bytes(self, data):
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        return f"{digest}:{len(data)}:{self.version}"
+
+    def get(self, key, stages):
+        stages = list(stages)
+        if not stages:
+            return {}
+        placeholders = ",".join("?" * len(stages))
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT stage, data, arrays FROM entries WHERE key = ? AND stage IN ({placeholders})",
+                [key] + stages,
+            ).fetchall()
+            if rows:
+                self._conn.execute(
+                    f"UPDATE entries SET accessed = ? WHERE key = ? AND stage IN ({placeholders})",
+                    [time.time(), key] + stages,
+                )
+        return {stage: _decode(data, arrays or b"") for stage, data, arrays in rows}
+
+    def put(self, key, values):
+        now = time.time()
+        with self._lock, self._conn:
+            for stage, value in values.items():
+                data, arrays = _encode(value)
+                size = len(data) + len(arrays)
+                old = self._conn.execute(
+                    "SELECT size FROM entries WHERE key = ? AND stage = ?", (key, stage)
+                ).fetchone()
+                if old:
+                    self._total -= old[0]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, stage, data, arrays, size, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, stage, data, sqlite3.Binary(arrays), size, now),
+                )
+                self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used rows until we are 10% under the limit
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, stage, size FROM entries ORDER BY accessed").fetchall()
+        doomed = []
+        for key, stage, size in rows:
+            if self._total <= target:
+                break
+            doomed.append((key, stage))
+            self._total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ? AND stage = ?", doomed)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM files")
+            self._total = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,283 @@
+import errno
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import re
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+from utils.instrumentation import instrumented
+
+# "manifest" records the decision (JSON manifest + optional XMP sidecar) without touching files
+EXPORT_MODES = ("copy", "hardlink", "reflink", "symlink", "move", "manifest")
+MANIFEST_NAME = "ailbums_manifest.json"
+
+# XMP ratings as understood by Lightroom/Bridge/darktable; -1 means rejected
+APPROVED_RATING = 1
+REJECTED_RATING = -1
+
+FICLONE = 0x40049409
+
+XMP_TEMPLATE = """<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="" xmlns:xmp="http://ns.adobe.com/xap/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+   <xmp:CreatorTool>{creator}</xmp:CreatorTool>
+   <xmp:Rating>{rating}</xmp:Rating>
+   <xmp:Label>{label}</xmp:Label>
+   <dc:description><rdf:Alt><rdf:li xml:lang="x-default">{description}</rdf:li></rdf:Alt></dc:description>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>
+"""
+
+# Marks the sidecars we write; only those still exactly in our layout are
+# replaced, as a photo manager saving its edits rewrites the whole packet
+XMP_CREATOR = "ailbums"
+_OWN_XMP = re.compile(
+    re.escape(XMP_TEMPLATE)
+    .replace(re.escape("{creator}"), re.escape(XMP_CREATOR))
+    .replace(re.escape("{rating}"), "-?[0-9]+")
+    .replace(re.escape("{label}"), "[^<]*")
+    .replace(re.escape("{description}"), "[^<]*")
+)
+
+
+def reflink(src, dst):
+    # Copy-on-write clone: FICLONE on Linux (btrfs, XFS, bcachefs), clonefile on macOS (APFS)
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+    elif sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), dst)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform", dst)
+
+
+def _link_or_copy(link, src, dst):
+    # Links fail across filesystems or where unsupported; fall back to a copy
+    try:
+        link(src, dst)
+        return None
+    except OSError as e:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        shutil.copy2(src, dst)
+        return f"copied ({e.strerror or e})"
+
+
+@instrumented("export")
+def export_file(src, dest_folder, mode):
+    """Place src in dest_folder using `mode`, replacing any previous export
+    of the same name. Returns (dest, note); note explains a fallback."""
+    dst = os.path.join(dest_folder, os.path.basename(src))
+    if mode == "move":
+        return shutil.move(src, dst), None
+    # Build next to the target and rename, so a re-run never leaves a half-written file
+    tmp = os.path.join(dest_folder, f".{os.path.basename(src)}.{threading.get_ident()}.tmp")
+    try:
+        note = None
+        if mode == "copy":
+            shutil.copy2(src, tmp)
+        elif mode == "hardlink":
+            note = _link_or_copy(os.link, src, tmp)
+        elif mode == "reflink":
+            note = _link_or_copy(reflink, src, tmp)
+        elif mode == "symlink":
+            os.symlink(os.path.abspath(src), tmp)
+        else:
+            raise ValueError(f"unknown export mode: {mode}")
+        os.replace(tmp, dst)
+        if os.path.lexists(tmp):
+            # rename() is a no-op when both names are already links to one file
+            os.unlink(tmp)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        raise
+    return dst, note
+
+
+def xmp_path(path):
+    return os.path.splitext(path)[0] + ".xmp"
+
+
+def _own_sidecar(sidecar):
+    # True if we wrote the sidecar and no other tool has rewritten it since
+    try:
+        with open(sidecar, encoding="utf-8") as f:
+            return _OWN_XMP.fullmatch(f.read()) is not None
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+@instrumented("xmp")
+def write_xmp(path, rating, label="", description=""):
+    # Sidecars may already hold the user's edits from another tool; only our
+    # own, untouched ones are rewritten, so a changed decision replaces them
+    sidecar = xmp_path(path)
+    if os.path.exists(sidecar) and not _own_sidecar(sidecar):
+        return None
+    content = XMP_TEMPLATE.format(
+        creator=XMP_CREATOR, rating=rating, label=escape(label), description=escape(description)
+    )
+    with open(sidecar, "w", encoding="utf-8") as f:
+        f.write(content)
+    return sidecar
+
+
+class Exporter:
+    """Places culled images with a bounded thread pool and records every
+    decision in a JSON manifest.
+
+    `mode` applies to approved images and `rejected_mode` to rejected ones;
+    by default rejected files are not copied at all, only recorded. With
+    `sidecars`, images left in place ("manifest") get an XMP sidecar carrying
+    their rating, which photo managers pick up.
+
+    Each finished entry is appended to <manifest>.log right away, and close()
+    turns the log into the manifest, so a killed run loses only the exports
+    still in flight. With `resume`, entries of the log (or, after a clean
+    close, of the manifest) are kept and the new ones added after them;
+    failed entries are dropped, as the caller is expected to retry those."""
+
+    def __init__(self, approved_folder, rejected_folder=None, mode="copy", rejected_mode="manifest",
+                 workers=4, sidecars=True, manifest_path=None, resume=False):
+        for m in (mode, rejected_mode):
+            if m not in EXPORT_MODES:
+                raise ValueError(f"unknown export mode: {m}")
+        self.approved_folder = approved_folder
+        self.rejected_folder = rejected_folder
+        self.mode = mode
+        self.rejected_mode = rejected_mode if rejected_folder else "manifest"
+        self.sidecars = sidecars
+        self.manifest_path = manifest_path or os.path.join(approved_folder, MANIFEST_NAME)
+        self.log_path = self.manifest_path + ".log"
+        self.entries = self._previous_entries() if resume else []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        self._log = open(self.log_path, "w", encoding="utf-8")
+        for entry in self.entries:
+            self._log_entry(entry)
+        # At most a few operations queued per worker so memory stays flat on huge shoots
+        self._slots = threading.BoundedSemaphore(workers * 4)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        if mode != "manifest":
+            os.makedirs(approved_folder, exist_ok=True)
+        if rejected_folder and self.rejected_mode != "manifest":
+            os.makedirs(rejected_folder, exist_ok=True)
+
+    def _previous_entries(self):
+        # An interrupted run left its log; a closed one only the manifest
+        entries = []
+        try:
+            if os.path.exists(self.log_path):
+                with open(self.log_path, encoding="utf-8") as f:
+                    for line in f.read().splitlines():
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            continue
+            else:
+                with open(self.manifest_path, encoding="utf-8") as f:
+                    entries = json.load(f).get("entries", [])
+        except (OSError, ValueError):
+            return []
+        return [entry for entry in entries if not entry.get("error")]
+
+    def _log_entry(self, entry):
+        self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._log.flush()
+
+    def submit(self, path, approved, reasons=(), on_done=None):
+        """Queues one image. on_done(entry), if given, is called from an
+        export thread once the image is placed (or failed, see entry["error"])
+        and its entry logged, e.g. to journal it only then."""
+        entry = {
+            "filename": os.path.basename(path),
+            "source": os.path.abspath(path),
+            "status": "approved" if approved else "rejected",
+            "reasons": list(reasons),
+            "rating": APPROVED_RATING if approved else REJECTED_RATING,
+            "mode": self.mode if approved else self.rejected_mode,
+            "dest": None,
+            "error": None,
+        }
+        with self._lock:
+            self.entries.append(entry)
+        self._slots.acquire()
+        try:
+            self._pool.submit(self._export, entry, on_done)
+        except BaseException:
+            self._slots.release()
+            raise
+        return entry
+
+    def _export(self, entry, on_done=None):
+        try:
+            self._place(entry)
+        except Exception as e:
+            entry["error"] = str(e)
+        try:
+            with self._lock:
+                self._log_entry(entry)
+            if on_done is not None:
+                on_done(entry)
+        finally:
+            self._slots.release()
+
+    def _place(self, entry):
+        if entry["mode"] == "manifest":
+            if self.sidecars:
+                entry["sidecar"] = write_xmp(
+                    entry["source"], entry["rating"],
+                    label="Approved" if entry["status"] == "approved" else "Rejected",
+                    description="; ".join(entry["reasons"]),
+                )
+            return
+        folder = self.approved_folder if entry["status"] == "approved" else self.rejected_folder
+        entry["dest"], note = export_file(entry["source"], folder, entry["mode"])
+        if note:
+            entry["note"] = note
+
+    def summary(self):
+        with self._lock:
+            entries = list(self.entries)
+        return {
+            "approved": sum(e["status"] == "approved" for e in entries),
+            "rejected": sum(e["status"] == "rejected" for e in entries),
+            "errors": [e for e in entries if e["error"]],
+        }
+
+    def close(self):
+        # Waits for every pending operation, then writes the manifest
+        self._pool.shutdown(wait=True)
+        manifest = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "mode": self.mode,
+            "rejected_mode": self.rejected_mode,
+            "entries": self.entries,
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.manifest_path)
+        if not self._log.closed:
+            self._log.close()
+            os.unlink(self.log_path)
+        return self.summary()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
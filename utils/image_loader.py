@@ -1,13 +1,100 @@
 import cv2
 import os
+from PIL import Image
+from utils.instrumentation import instrumented
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Largest DCT scale factor first so we decode as little as possible
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def list_image_paths(folder):
+    return [
+        os.path.join(folder, filename)
+        for filename in sorted(os.listdir(folder))
+        if filename.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def scan_folder(folder):
+    # Path + metadata only, never touches pixel data
+    entries = []
+    for path in list_image_paths(folder):
+        st = os.stat(path)
+        entries.append({
+            "filename": os.path.basename(path),
+            "path": path,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+        })
+    return entries
+
+
+def image_size(path):
+    # PIL only parses the header here, pixels are not decoded
+    with Image.open(path) as img:
+        return img.size
+
+
+def resize_to_side(image, max_side):
+    if image is None or not max_side:
+        return image
+    height, width = image.shape[:2]
+    long_edge = max(height, width)
+    if long_edge <= max_side:
+        return image
+    scale = max_side / long_edge
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def scale_to_side(image, side):
+    # Like resize_to_side but also enlarges smaller images, for measurements
+    # (Laplacian variance) that change with the image's scale
+    if image is None or not side:
+        return image
+    height, width = image.shape[:2]
+    long_edge = max(height, width)
+    if long_edge > side:
+        return resize_to_side(image, side)
+    if long_edge == side:
+        return image
+    scale = side / long_edge
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_CUBIC)
+
+
+@instrumented("decode")
+def load_image(path, max_side=None):
+    if not max_side:
+        return cv2.imread(path)
+    try:
+        long_edge = max(image_size(path))
+    except Exception:
+        return resize_to_side(cv2.imread(path), max_side)
+    flag = cv2.IMREAD_COLOR
+    for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+        if long_edge // factor >= max_side:
+            flag = reduced_flag
+            break
+    return resize_to_side(cv2.imread(path, flag), max_side)
+
+
+def analysis_side(*sides):
+    # Decode once at the largest resolution any of the requested analyzers needs
+    return max(sides) if sides else None
+
 
 def load_images_from_folder(folder):
+    # Decodes the whole folder into memory; the pipeline decodes per image instead
     images = {}
-    for filename in os.listdir(folder):
-        if filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            img_path = os.path.join(folder, filename)
-            img = cv2.imread(img_path)
-            if img is not None:
-                images[filename] = img
+    for path in list_image_paths(folder):
+        img = load_image(path)
+        if img is not None:
+            images[os.path.basename(path)] = img
     return images
-
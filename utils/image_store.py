@@ -0,0 +1,187 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+import numpy as np
+from utils.analysis_cache import DEFAULT_CACHE_PATH
+from utils.image_loader import load_image
+
+# On disk next to the analysis cache: /tmp is often tmpfs, where "paged out"
+# images would still sit in memory. Each store gets its own run_<pid>_ folder
+DEFAULT_IMAGE_ROOT = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "images")
+
+# Small and picklable: this, not the pixels, is what crosses process boundaries
+ImageHandle = namedtuple("ImageHandle", ["file", "shape"])
+
+
+def open_image(handle):
+    # Read-only memory map; pages are loaded on access and can be dropped by the OS
+    return np.load(handle.file, mmap_mode="r")
+
+
+def _remove_stale_runs(parent):
+    # Folders of stores whose process died without close(), e.g. a killed run
+    for entry in os.scandir(parent):
+        parts = entry.name.split("_")
+        if len(parts) < 3 or parts[0] != "run" or not parts[1].isdigit():
+            continue
+        try:
+            os.kill(int(parts[1]), 0)
+        except ProcessLookupError:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            # Alive, but someone else's
+            pass
+
+
+class ImageStore:
+    """Decoded images as .npy files in `root`, shared by handle between the
+    pipeline's worker processes and the GUI.
+
+    Each image is decoded once at `max_side` and every later reader maps the
+    same file, so resident memory is the working set rather than the whole
+    shoot. Without a root a fresh folder under DEFAULT_IMAGE_ROOT is used and
+    removed on close(). Past max_size_mb the least recently written files are
+    deleted; a lookup for an evicted image simply decodes it again, so call
+    reserve() with the number of images a run will store.
+
+    The directory is trimmed whenever TRIM_FRACTION of the budget has been
+    written since the last trim. Worker processes get a fresh copy of the
+    store with every task, so their writes are counted by the parent through
+    track() instead."""
+
+    TRIM_FRACTION = 0.1
+
+    def __init__(self, root=None, max_side=None, max_size_mb=4096):
+        self._owned = root is None
+        if root is None:
+            os.makedirs(DEFAULT_IMAGE_ROOT, exist_ok=True)
+            _remove_stale_runs(DEFAULT_IMAGE_ROOT)
+            root = tempfile.mkdtemp(prefix=f"run_{os.getpid()}_", dir=DEFAULT_IMAGE_ROOT)
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.max_side = max_side
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self._written = 0
+
+    def __getstate__(self):
+        # Workers get the location only; the copy never deletes the directory
+        state = self.__dict__.copy()
+        state["_owned"] = False
+        state["_written"] = 0
+        return state
+
+    def image_bytes(self):
+        # Upper bound for one stored 4:3 (or 3:4) BGR image at max_side
+        if not self.max_side:
+            return None
+        return self.max_side * (self.max_side * 3 // 4) * 3 + 128
+
+    def reserve(self, count):
+        """Grows the budget to hold `count` images, so a pass over a whole
+        shoot doesn't evict what the next pass reads. Raises OSError if the
+        disk doesn't have room for them."""
+        size = self.image_bytes()
+        if size is None or count * size <= self.max_bytes:
+            return
+        needed = count * size
+        available = shutil.disk_usage(self.root).free + self._usage()
+        if needed > available:
+            raise OSError(
+                f"decoded images need {needed / 2**20:.0f} MB in {self.root}, "
+                f"only {available / 2**20:.0f} MB available"
+            )
+        self.max_bytes = needed
+
+    def _usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _file(self, path):
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}:{self.max_side}"
+        return os.path.join(self.root, hashlib.blake2b(ident.encode(), digest_size=16).hexdigest() + ".npy")
+
+    def lookup(self, path):
+        # Handle of an already stored image, or None; never decodes
+        try:
+            file = self._file(path)
+            return ImageHandle(file, open_image(ImageHandle(file, None)).shape)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, path, image):
+        file = self._file(path)
+        # Written under a temporary name so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        os.close(fd)
+        try:
+            target = np.lib.format.open_memmap(tmp, mode="w+", dtype=image.dtype, shape=image.shape)
+            target[...] = image
+            target.flush()
+            del target
+            os.replace(tmp, file)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        handle = ImageHandle(file, image.shape)
+        self.track(handle)
+        return handle
+
+    def track(self, handle):
+        # Counts a file written here or by a worker, trimming once enough has
+        # accumulated; the file itself is never the one evicted
+        try:
+            self._written += os.path.getsize(handle.file)
+        except OSError:
+            return
+        if self._written >= self.max_bytes * self.TRIM_FRACTION:
+            self._written = 0
+            self.trim(keep=handle.file)
+
+    def load(self, path):
+        # Handle for path, decoding it into the store on first use; None if undecodable
+        handle = self.lookup(path)
+        if handle is not None:
+            return handle
+        image = load_image(path, self.max_side)
+        if image is None:
+            return None
+        return self.put(path, image)
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".npy"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    # Evicted by another process meanwhile
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def trim(self, keep=None):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_bytes * (1 - self.TRIM_FRACTION):
+                break
+            if file == keep:
+                continue
+            try:
+                os.unlink(file)
+            except OSError:
+                # Still mapped by a reader on platforms that forbid deleting open files
+                continue
+            total -= size
+
+    def close(self):
+        if self._owned:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
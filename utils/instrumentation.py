@@ -0,0 +1,225 @@
+import bisect
+import cProfile
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Set by enable() so worker processes, forked or spawned, inherit the setting
+METRICS_ENV = "AILBUMS_METRICS"
+TRACE_ENV = "AILBUMS_TRACE_DIR"
+
+# Histogram bucket upper bounds in seconds, Prometheus style
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.environ.get(METRICS_ENV, "") not in ("", "0")
+_trace_dir = os.environ.get(TRACE_ENV) or None
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+    os.environ[METRICS_ENV] = "1" if on else "0"
+
+
+def enabled():
+    return _enabled
+
+
+def set_trace_dir(folder):
+    # cProfile output per image; None turns tracing off
+    global _trace_dir
+    _trace_dir = folder or None
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+        os.environ[TRACE_ENV] = folder
+    else:
+        os.environ.pop(TRACE_ENV, None)
+
+
+class Registry:
+    """Per-stage call counts, error counts and latency histograms, plus plain
+    counters. Thread safe; a worker process's registry is shipped back to the
+    parent with collect() and merge()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # name -> [calls, errors, total seconds, bucket counts (last is +Inf)]
+            self.stages = {}
+            self.counters = {}
+
+    def record(self, name, seconds, error=False):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0, 0, 0.0, [0] * (len(BUCKETS) + 1)]
+            stage[0] += 1
+            stage[1] += error
+            stage[2] += seconds
+            stage[3][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {name: [s[0], s[1], s[2], list(s[3])] for name, s in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def drain(self):
+        with self._lock:
+            snapshot = {"stages": self.stages, "counters": self.counters}
+            self.stages = {}
+            self.counters = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        if not snapshot:
+            return
+        with self._lock:
+            for name, (calls, errors, total, buckets) in snapshot["stages"].items():
+                stage = self.stages.get(name)
+                if stage is None:
+                    self.stages[name] = [calls, errors, total, list(buckets)]
+                    continue
+                stage[0] += calls
+                stage[1] += errors
+                stage[2] += total
+                stage[3] = [a + b for a, b in zip(stage[3], buckets)]
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        # One row per stage, slowest total first; percentiles are interpolated within buckets
+        rows = []
+        for name, (calls, errors, total, buckets) in self.snapshot()["stages"].items():
+            rows.append({
+                "stage": name,
+                "calls": calls,
+                "errors": errors,
+                "total_s": total,
+                "mean_ms": total / calls * 1000 if calls else 0.0,
+                "p50_ms": _quantile(buckets, 0.5) * 1000,
+                "p90_ms": _quantile(buckets, 0.9) * 1000,
+                "p99_ms": _quantile(buckets, 0.99) * 1000,
+            })
+        rows.sort(key=lambda row: row["total_s"], reverse=True)
+        return rows
+
+    def prometheus(self, prefix="ailbums"):
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Wall time per call of each analysis stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for name, (calls, _, total, buckets) in sorted(snapshot["stages"].items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), buckets):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {calls}')
+        lines.append(f"# HELP {prefix}_stage_errors_total Calls of each stage that raised.")
+        lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+        for name, stage in sorted(snapshot["stages"].items()):
+            lines.append(f'{prefix}_stage_errors_total{{stage="{name}"}} {stage[1]}')
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _quantile(buckets, q):
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            low = BUCKETS[i - 1] if i else 0.0
+            high = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+            return low + (high - low) * (rank - seen) / count
+        seen += count
+    return BUCKETS[-1]
+
+
+registry = Registry()
+
+
+def instrumented(name):
+    """Decorator recording every call of the function under `name`. While
+    metrics are disabled the only cost is one global lookup per call."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            error = True
+            try:
+                value = func(*args, **kwargs)
+                error = False
+                return value
+            finally:
+                registry.record(name, time.perf_counter() - start, error)
+        return wrapper
+    return decorate
+
+
+def increment(name, value=1):
+    if _enabled:
+        registry.increment(name, value)
+
+
+def worker_init():
+    # ProcessPoolExecutor initializer: a forked worker starts with a copy of
+    # the parent's numbers (and possibly a held lock), so it gets a fresh registry
+    global registry
+    registry = Registry()
+
+
+def collect():
+    # Called in worker processes: hands over (and clears) what the worker
+    # recorded since the last call, for the parent to merge()
+    return registry.drain() if _enabled else None
+
+
+def merge(snapshot):
+    registry.merge(snapshot)
+
+
+@contextmanager
+def trace(label, path):
+    """Profiles the block with cProfile into <trace dir>/<image>.<label>.prof
+    when a trace directory is set (see set_trace_dir), for snakeviz or
+    `python -m pstats`. A no-op otherwise."""
+    if _trace_dir is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        name = f"{os.path.basename(path)}.{label}.{os.getpid()}.prof"
+        profile.dump_stats(os.path.join(_trace_dir, name))
+
+
+def format_report(rows):
+    lines = [f"  {'stage':<24} {'calls':>7} {'errors':>6} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}"]
+    for row in rows:
+        lines.append(
+            f"  {row['stage']:<24} {row['calls']:>7} {row['errors']:>6} {row['total_s']:9.2f} {row['mean_ms']:9.2f} "
+            f"{row['p50_ms']:9.2f} {row['p90_ms']:9.2f} {row['p99_ms']:9.2f}"
+        )
+    return "\n".join(lines)
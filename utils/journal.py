@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import numpy as np
+
+JOURNAL_NAME = ".ailbums_journal.jsonl"
+# fsync after this many records; a crash loses at most these, which are then redone
+SYNC_EVERY = 25
+
+
+def _plain(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+class RunJournal:
+    """Append-only JSONL record of a culling run: a header line with the run's
+    settings, then one line per decided image.
+
+    Opening an existing journal whose settings match returns its records so
+    the run can skip and replay them; a journal written with other settings
+    is set aside as <name>.old and a fresh one started. A torn last line from
+    an interrupted write is ignored."""
+
+    def __init__(self, path, settings, fresh=False):
+        self.path = path
+        self.settings = _plain(settings)
+        self.records = [] if fresh else self._load()
+        self._pending = 0
+        # Records may be appended from export threads as their files land
+        self._lock = threading.Lock()
+        if fresh and os.path.exists(path):
+            os.replace(path, path + ".old")
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        if not new:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._file = open(path, "a", encoding="utf-8")
+        if new:
+            self._write({"type": "run", "settings": self.settings})
+        elif torn:
+            self._file.write("\n")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        header = None
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if header is None:
+                header = record
+                if header.get("type") != "run" or header.get("settings") != self.settings:
+                    break
+            elif record.get("type") == "image":
+                records.append(record)
+        if header is None or header.get("type") != "run" or header.get("settings") != self.settings:
+            os.replace(self.path, self.path + ".old")
+            return []
+        return records
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= SYNC_EVERY:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def decided(self):
+        return {os.path.abspath(record["path"]) for record in self.records}
+
+    def append(self, path, approved, reasons, committed):
+        # Absolute, so a run resumed with another spelling of the folder still matches
+        path = os.path.abspath(path)
+        record = {
+            "type": "image",
+            "path": path,
+            "filename": os.path.basename(path),
+            "approved": approved,
+            "reasons": list(reasons),
+            "committed": _plain(committed),
+        }
+        with self._lock:
+            self._write(record)
+            self.records.append(record)
+        return record
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+from utils.image_loader import load_image, resize_to_side
+
+# Long edge in pixels of each pyramid level, smallest first
+THUMBNAIL_SIZES = {
+    "grid": 140,
+    "preview": 800,
+    "loupe": 1600,
+}
+DEFAULT_THUMBNAIL_DIR = os.path.join(os.path.expanduser("~"), ".ailbums_cache", "thumbnails")
+
+IFD1 = -1
+JPEG_OFFSET = 0x0201
+JPEG_LENGTH = 0x0202
+ORIENTATION = 0x0112
+# EXIF orientation -> what turns the stored pixels upright, as imread does for full images
+ORIENTATIONS = {
+    2: lambda img: cv2.flip(img, 1),
+    3: lambda img: cv2.rotate(img, cv2.ROTATE_180),
+    4: lambda img: cv2.flip(img, 0),
+    5: cv2.transpose,
+    6: lambda img: cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
+    7: lambda img: cv2.flip(cv2.transpose(img), -1),
+    8: lambda img: cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE),
+}
+JPEG_QUALITY = 85
+# Bytes hashed from each end of a file for its cache key
+KEY_SAMPLE = 64 * 1024
+# Part of every key; bump when generated thumbnails change so stale ones are remade
+THUMBNAIL_VERSION = b"2"
+
+
+def thumbnail_key(path):
+    # Content address from the size plus the first and last 64 KiB: EXIF and
+    # the end of the entropy-coded data, so edits and re-exports change it
+    # without reading whole raw-sized files
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(THUMBNAIL_VERSION)
+    size = os.path.getsize(path)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(KEY_SAMPLE))
+        if size > 2 * KEY_SAMPLE:
+            f.seek(-KEY_SAMPLE, os.SEEK_END)
+            digest.update(f.read(KEY_SAMPLE))
+    return digest.hexdigest()
+
+
+def embedded_thumbnail(path):
+    # JPEG preview stored in EXIF IFD1 by most cameras, decoded without
+    # touching the main image and turned upright like the main image would
+    # be; None if the file has none
+    try:
+        with Image.open(path) as img:
+            raw = img.info.get("exif")
+            exif = img.getexif()
+            ifd1 = exif.get_ifd(IFD1)
+            orientation = exif.get(ORIENTATION)
+    except Exception:
+        return None
+    offset, length = ifd1.get(JPEG_OFFSET), ifd1.get(JPEG_LENGTH)
+    if not raw or not offset or not length:
+        return None
+    # Offsets count from the TIFF header, which follows the "Exif\0\0" marker
+    start = 6 + offset if raw.startswith(b"Exif") else offset
+    data = np.frombuffer(raw[start:start + length], dtype=np.uint8)
+    if not len(data):
+        return None
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is None or orientation not in ORIENTATIONS:
+        return image
+    return ORIENTATIONS[orientation](image)
+
+
+class ThumbnailService:
+    """Multi-size thumbnails in a content-addressed on-disk cache.
+
+    get() returns a level synchronously; request() generates it on a
+    background thread pool and hands it to a callback (called from a pool
+    thread, so GUI callers should forward it through a queued signal). A level
+    is made from the embedded EXIF preview when that is large enough, else
+    from the next larger cached level, else by a reduced-resolution decode."""
+
+    def __init__(self, cache_dir=DEFAULT_THUMBNAIL_DIR, workers=4):
+        self.cache_dir = cache_dir
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._keys = {}
+        self._generation = 0
+
+    def _key(self, path):
+        st = os.stat(path)
+        ident = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            known = self._keys.get(path)
+        if known and known[0] == ident:
+            return known[1]
+        key = thumbnail_key(path)
+        with self._lock:
+            self._keys[path] = (ident, key)
+        return key
+
+    def cached_file(self, path, size="grid"):
+        key = self._key(path)
+        return os.path.join(self.cache_dir, size, key[:2], key + ".jpg")
+
+    def _read(self, file):
+        if not os.path.exists(file):
+            return None
+        return cv2.imread(file)
+
+    def _write(self, file, image):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = f"{file}.{threading.get_ident()}.tmp.jpg"
+        cv2.imwrite(tmp, image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        os.replace(tmp, file)
+
+    def _source(self, path, size):
+        side = THUMBNAIL_SIZES[size]
+        embedded = embedded_thumbnail(path)
+        if embedded is not None and max(embedded.shape[:2]) >= side:
+            return embedded
+        larger = [name for name, s in THUMBNAIL_SIZES.items() if s > side]
+        for name in larger:
+            image = self._read(self.cached_file(path, name))
+            if image is not None:
+                return image
+        return load_image(path, side)
+
+    def get(self, path, size="grid"):
+        # Thumbnail as a BGR array no longer than THUMBNAIL_SIZES[size], or None
+        try:
+            file = self.cached_file(path, size)
+        except OSError:
+            return None
+        image = self._read(file)
+        if image is not None:
+            return image
+        image = resize_to_side(self._source(path, size), THUMBNAIL_SIZES[size])
+        if image is not None:
+            self._write(file, image)
+        return image
+
+    def request(self, path, size, callback):
+        """Generate in the background and call callback(path, size, image);
+        image is None if the file can't be read. Repeated requests for the same
+        thumbnail while one is in flight share it."""
+        with self._lock:
+            waiting = self._pending.get((path, size))
+            if waiting is not None:
+                waiting.append(callback)
+                return
+            self._pending[(path, size)] = [callback]
+            generation = self._generation
+        self._pool.submit(self._run, path, size, generation)
+
+    def _run(self, path, size, generation):
+        image = None
+        with self._lock:
+            stale = generation != self._generation
+        if not stale:
+            try:
+                image = self.get(path, size)
+            except Exception:
+                image = None
+        with self._lock:
+            callbacks = self._pending.pop((path, size), [])
+        if not stale:
+            for callback in callbacks:
+                callback(path, size, image)
+
+    def cancel_pending(self):
+        # Drop queued work, e.g. when another folder is opened
+        with self._lock:
+            self._generation += 1
+
+    def close(self):
+        self.cancel_pending()
+        self._pool.shutdown(wait=True, cancel_futures=True)